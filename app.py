@@ -1,21 +1,177 @@
+import time
+
+# Marca o início do processo antes dos demais imports para medir o cold start
+_PROCESS_START = time.perf_counter()
+
 import os
 import sys
-import requests
-import pyodbc
 import json
-import schedule
-import time
+import hashlib
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Tuple
 import logging
 from logging.handlers import RotatingFileHandler
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urlparse
 import traceback
+import contextlib
+from collections import deque
 from dotenv import load_dotenv
 
 # Carrega variáveis de ambiente do arquivo .env
 load_dotenv()
 
+# requests, pyodbc e schedule são importados sob demanda (no primeiro uso)
+# para reduzir o tempo de partida do executável empacotado
+_IMPORTS_DONE = time.perf_counter()
+
+# Versão atual do schema do banco; incremente ao adicionar uma migração
+SCHEMA_VERSION = 8
+
+# Colunas da tabela calls na ordem das tuplas geradas por build_call_values
+CALL_COLUMNS = (
+    'id', 'list_name', 'number', 'call_date', 'call_date_rfc3339', 'campaign_id', 'campaign',
+    'queue_id', 'queue_name', 'ring_group_id', 'ring_group_name', 'ivr_name', 'receptive_name', 'receptive_phone', 'receptive_did',
+    'has_agent', 'agent', 'acw_time', 'speaking_time', 'ivr_time', 'ivr_after_call_time', 'amd_time',
+    'waiting_time', 'speaking_with_agent_time', 'route_id', 'route_name', 'route_host',
+    'route_endpoint', 'route_caller_id', 'billed_time', 'billed_value', 'qualification',
+    'behavior', 'readable_behavior_text', 'phone_type', 'recording', 'recording_amd',
+    'status_id', 'readable_status_text', 'readable_amd_status_text', 'mode',
+    'hangup_cause', 'sip_cause', 'readable_hangup_cause_text', 'feedback',
+    'recorded', 'ended_by_agent', 'qualification_note', 'sid', 'is_dmc',
+    'is_unknown', 'is_transferred', 'is_consult', 'is_transfer', 'is_conversion',
+    'qualification_id', 'consult_cancelled', 'recording_transfer', 'recording_consult',
+    'recording_after_consult_cancel', 'ivr_digit_pressed', 'record_name', 'transcription', 'ai_evaluation_status'
+)
+
+# Colunas da tabela mailing_data na ordem das tuplas geradas por build_mailing_values
+MAILING_COLUMNS = (
+    '_id', 'call_id', 'identifier', 'campaign_id', 'company_id', 'list_id',
+    'uf', 'phone', 'dialed_phone', 'dialed_identifier', 'on_calling',
+    'column_position', 'row_position', 'estrategia', 'razao_social', 'nome_fantasia',
+    'valor_conta', 'cidade', 'cep', 'uf_mailing', 'socio'
+)
+
+INSERT_CALL_SQL = (
+    f"INSERT INTO calls ({', '.join(CALL_COLUMNS)}, row_hash) "
+    f"VALUES ({', '.join('?' for _ in CALL_COLUMNS)}, ?)"
+)
+
+UPDATE_CALL_SQL = (
+    f"UPDATE calls SET {', '.join(f'{column} = ?' for column in CALL_COLUMNS[1:])}, "
+    f"row_hash = ?, updated_at = GETDATE() WHERE id = ?"
+)
+
+INSERT_MAILING_SQL = (
+    f"INSERT INTO mailing_data ({', '.join(MAILING_COLUMNS)}) "
+    f"VALUES ({', '.join('?' for _ in MAILING_COLUMNS)})"
+)
+
+def _seconds_sql(column: str) -> str:
+    """Expressão SQL que converte um tempo NVARCHAR (segundos ou HH:MM:SS) em segundos"""
+    return (f"COALESCE(TRY_CONVERT(BIGINT, {column}), "
+            f"DATEDIFF(SECOND, CAST('00:00:00' AS TIME), TRY_CONVERT(TIME, {column})), 0)")
+
+
+# Recalcula os agregados de um dia a partir de calls (parâmetros: início e fim do dia;
+# o filtro de campanhas é acrescentado em refresh_rollup_day)
+INSERT_ROLLUP_SQL = f"""
+INSERT INTO calls_daily_rollup (
+    rollup_date, campaign_id, agent, readable_status_text, qualification, call_count,
+    speaking_time_seconds, speaking_with_agent_time_seconds, waiting_time_seconds,
+    billed_time_seconds, billed_value_sum, conversion_count, dmc_count
+)
+SELECT
+    CAST(call_date AS DATE), campaign_id, agent, readable_status_text, qualification, COUNT(*),
+    SUM({_seconds_sql('speaking_time')}),
+    SUM({_seconds_sql('speaking_with_agent_time')}),
+    SUM({_seconds_sql('waiting_time')}),
+    SUM({_seconds_sql('billed_time')}),
+    SUM(ISNULL(TRY_CONVERT(DECIMAL(18, 4), REPLACE(billed_value, ',', '.')), 0)),
+    SUM(CASE WHEN is_conversion = 1 THEN 1 ELSE 0 END),
+    SUM(CASE WHEN is_dmc = 1 THEN 1 ELSE 0 END)
+FROM calls
+WHERE call_date >= ? AND call_date < ? AND campaign_id IS NOT NULL{{campaign_filter}}
+GROUP BY CAST(call_date AS DATE), campaign_id, agent, readable_status_text, qualification
+"""
+
+# Colunas de calls com URLs de gravação baixadas pelo RecordingDownloader
+RECORDING_COLUMNS = ('recording', 'recording_amd', 'recording_transfer', 'recording_consult')
+
+# Gravações pendentes de chamadas recentes: sem linha em call_recordings ou com falha
+# elegível para nova tentativa (parâmetros: limite, data mínima, máx. de tentativas e
+# campanhas, acrescentadas em {campaign_placeholders})
+RECORDING_BACKLOG_SQL = f"""
+SELECT TOP (?) c.id, r.kind, r.url
+FROM calls c
+CROSS APPLY (VALUES {', '.join(f"('{kind}', c.{kind})" for kind in RECORDING_COLUMNS)}) AS r(kind, url)
+LEFT JOIN call_recordings cr ON cr.call_id = c.id AND cr.kind = r.kind
+WHERE c.call_date >= ? AND r.url IS NOT NULL AND r.url <> ''
+  AND (cr.call_id IS NULL
+       OR (cr.status = 'FAILED' AND cr.attempts < ? AND (cr.next_attempt_at IS NULL OR cr.next_attempt_at <= GETDATE())))
+  AND c.campaign_id IN ({{campaign_placeholders}})
+ORDER BY c.call_date DESC
+"""
+
+# Quantidade máxima de chamadas com falha detalhadas em execution_logs.error_message
+FAILED_CALLS_IN_LOG = 50
+
+# Quantidade de IDs por consulta de hashes (SQL Server aceita até 2100 parâmetros)
+HASH_LOOKUP_CHUNK_SIZE = 1000
+
+# Colunas copiadas para as tabelas de arquivo pela rotina de retenção
+ARCHIVE_CALL_COLUMNS = CALL_COLUMNS + ('row_hash', 'created_at', 'updated_at')
+ARCHIVE_MAILING_COLUMNS = MAILING_COLUMNS + ('created_at', 'updated_at')
+
+# Limites do tamanho adaptativo dos lotes da retenção
+RETENTION_MIN_CHUNK_SIZE = 50
+
+def _retention_calls_sql(archive: bool) -> str:
+    """
+    Lote da retenção de calls (parâmetros: tamanho do lote e data de corte). Remove
+    explicitamente mailing_data e call_recordings antes de calls, sem depender do
+    ON DELETE CASCADE; com archive, copia as linhas para as tabelas de arquivo antes.
+    Retorna (calls, mailing_data, call_recordings) removidos.
+    """
+    archive_sql = ""
+    if archive:
+        calls_columns = ', '.join(ARCHIVE_CALL_COLUMNS)
+        mailing_columns = ', '.join(ARCHIVE_MAILING_COLUMNS)
+        # Registros re-sincronizados após um arquivamento anterior substituem a cópia antiga
+        archive_sql = f"""
+DELETE FROM mailing_data_archive WHERE call_id IN (SELECT id FROM @ids);
+INSERT INTO mailing_data_archive ({mailing_columns})
+SELECT {mailing_columns} FROM mailing_data WHERE call_id IN (SELECT id FROM @ids);
+DELETE FROM calls_archive WHERE id IN (SELECT id FROM @ids);
+INSERT INTO calls_archive ({calls_columns})
+SELECT {calls_columns} FROM calls WHERE id IN (SELECT id FROM @ids);
+"""
+    # READPAST: instâncias concorrentes não pegam as mesmas linhas
+    return f"""
+SET NOCOUNT ON;
+DECLARE @ids TABLE (id NVARCHAR(50) PRIMARY KEY);
+DECLARE @calls INT, @mailing INT, @recordings INT;
+INSERT INTO @ids (id)
+SELECT TOP (?) id FROM calls WITH (UPDLOCK, READPAST, ROWLOCK)
+WHERE call_date < ? ORDER BY call_date;
+{archive_sql}
+DELETE FROM mailing_data WHERE call_id IN (SELECT id FROM @ids);
+SET @mailing = @@ROWCOUNT;
+DELETE FROM call_recordings WHERE call_id IN (SELECT id FROM @ids);
+SET @recordings = @@ROWCOUNT;
+DELETE FROM calls WHERE id IN (SELECT id FROM @ids);
+SET @calls = @@ROWCOUNT;
+SELECT @calls, @mailing, @recordings;
+"""
+
+
+def _retention_delete_sql(table: str) -> str:
+    """Lote da retenção de tabelas de controle por created_at (parâmetros: tamanho e corte)"""
+    return f"""
+SET NOCOUNT ON;
+DELETE TOP (?) FROM {table} WHERE created_at < ? AND status <> 'RUNNING';
+SELECT @@ROWCOUNT;
+"""
+
 
 class DatabaseManager:
     """Gerenciador de conexão e operações de banco de dados"""
@@ -25,69 +181,69 @@ class DatabaseManager:
         self.logger = logger
         self.connection = None
     
-    def test_connection(self) -> Tuple[bool, Optional[str]]:
+    def _connection_string(self) -> str:
+        """Monta a string de conexão ODBC a partir da configuração"""
+        return (
+            f"DRIVER={{{self.config['driver']}}};"
+            f"SERVER={self.config['server']};"
+            f"DATABASE={self.config['database']};"
+            f"UID={self.config['username']};"
+            f"PWD={self.config['password']};"
+            f"TrustServerCertificate=yes;"
+            f"Connection Timeout=30;"
+        )
+    
+    def connect_and_check_schema(self) -> Tuple[bool, Optional[str], int]:
         """
-        Testa a conexão com o banco de dados
-        Returns: (sucesso: bool, erro: Optional[str])
+        Abre a conexão (mantida para reutilização) e, na mesma ida ao banco,
+        testa a conectividade e lê a versão do schema gravada
+        Returns: (sucesso: bool, erro: Optional[str], versão_schema: int)
         """
-        self.logger.info("🔌 Iniciando teste de conexão com banco de dados...")
+        import pyodbc
+        
+        self.logger.info("🔌 Conectando ao banco de dados e verificando versão do schema...")
+        self.logger.debug(f"📝 String de conexão: DRIVER={self.config['driver']};SERVER={self.config['server']};DATABASE={self.config['database']};UID={self.config['username']};PWD=***")
         
         try:
-            connection_string = (
-                f"DRIVER={{{self.config['driver']}}};"
-                f"SERVER={self.config['server']};"
-                f"DATABASE={self.config['database']};"
-                f"UID={self.config['username']};"
-                f"PWD={self.config['password']};"
-                f"TrustServerCertificate=yes;"
-                f"Connection Timeout=30;"
-            )
-            
-            self.logger.debug(f"📝 String de conexão: DRIVER={self.config['driver']};SERVER={self.config['server']};DATABASE={self.config['database']};UID={self.config['username']};PWD=***")
-            
-            test_conn = pyodbc.connect(connection_string)
-            
-            # Testa uma query simples
-            cursor = test_conn.cursor()
-            cursor.execute("SELECT 1 as test")
-            result = cursor.fetchone()
-            cursor.close()
-            test_conn.close()
+            cursor = self.get_connection().cursor()
+            try:
+                # Uma única consulta valida a conexão e retorna a versão do schema
+                cursor.execute("""
+                IF OBJECT_ID('schema_version', 'U') IS NULL
+                    SELECT 1 AS test, 0 AS version
+                ELSE
+                    SELECT 1 AS test, ISNULL(MAX(version), 0) AS version FROM schema_version
+                """)
+                result = cursor.fetchone()
+            finally:
+                cursor.close()
             
             if result and result[0] == 1:
-                self.logger.info("✅ Conexão com banco de dados testada com sucesso!")
-                return True, None
+                self.logger.info(f"✅ Conexão com banco de dados testada com sucesso! (schema v{result[1]})")
+                return True, None, int(result[1])
             else:
                 error_msg = "❌ Teste de query falhou - resultado inesperado"
                 self.logger.error(error_msg)
-                return False, error_msg
+                return False, error_msg, 0
                 
         except pyodbc.Error as e:
             error_msg = f"❌ Erro de conexão pyodbc: {e}"
             self.logger.error(error_msg)
-            return False, error_msg
+            return False, error_msg, 0
         except Exception as e:
             error_msg = f"❌ Erro inesperado na conexão: {e}"
             self.logger.error(error_msg)
-            return False, error_msg
+            return False, error_msg, 0
     
     def get_connection(self):
         """Obtém conexão com o banco de dados"""
         if self.connection is None:
-            self.logger.info("🔗 Estabelecendo nova conexão com banco de dados...")
+            import pyodbc
             
-            connection_string = (
-                f"DRIVER={{{self.config['driver']}}};"
-                f"SERVER={self.config['server']};"
-                f"DATABASE={self.config['database']};"
-                f"UID={self.config['username']};"
-                f"PWD={self.config['password']};"
-                f"TrustServerCertificate=yes;"
-                f"Connection Timeout=30;"
-            )
+            self.logger.info("🔗 Estabelecendo nova conexão com banco de dados...")
             
             try:
-                self.connection = pyodbc.connect(connection_string)
+                self.connection = pyodbc.connect(self._connection_string())
                 self.logger.info("✅ Conexão estabelecida com sucesso!")
             except Exception as e:
                 self.logger.error(f"❌ Erro ao conectar: {e}")
@@ -105,169 +261,378 @@ class DatabaseManager:
             except Exception as e:
                 self.logger.error(f"❌ Erro ao fechar conexão: {e}")
     
-    def create_tables(self):
-        """Cria as tabelas necessárias se não existirem"""
-        self.logger.info("🗃️ Verificando e criando tabelas necessárias...")
+    def create_tables(self, current_version: int = 0):
+        """
+        Cria/atualiza as tabelas necessárias a partir da versão de schema
+        gravada no banco. Não executa DDL se o schema já está atualizado.
+        """
+        if current_version >= SCHEMA_VERSION:
+            self.logger.info(f"✅ Schema já está na versão {current_version} - nenhuma DDL necessária")
+            return
+        
+        self.logger.info(f"🗃️ Atualizando schema da versão {current_version} para {SCHEMA_VERSION}...")
         
         cursor = self.get_connection().cursor()
         
         try:
-            # Tabela principal de chamadas
-            self.logger.info("📋 Criando tabela 'calls' se não existir...")
-            create_calls_table = """
-            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='calls' AND xtype='U')
-            BEGIN
-                CREATE TABLE calls (
-                    id NVARCHAR(50) PRIMARY KEY,
-                    list_name NVARCHAR(255),
-                    number NVARCHAR(50),
-                    call_date DATETIME,
-                    call_date_rfc3339 NVARCHAR(50),
-                    campaign_id INT,
-                    campaign NVARCHAR(255),
-                    queue_id NVARCHAR(50),
-                    queue_name NVARCHAR(255),
-                    ring_group_id NVARCHAR(50),
-                    ring_group_name NVARCHAR(255),
-                    ivr_name NVARCHAR(255),
-                    receptive_name NVARCHAR(255),
-                    receptive_phone NVARCHAR(50),
-                    receptive_did NVARCHAR(50),
-                    has_agent BIT,
-                    agent NVARCHAR(255),
-                    acw_time NVARCHAR(20),
-                    speaking_time NVARCHAR(20),
-                    ivr_time NVARCHAR(20),
-                    ivr_after_call_time NVARCHAR(20),
-                    amd_time NVARCHAR(20),
-                    waiting_time NVARCHAR(20),
-                    speaking_with_agent_time NVARCHAR(20),
-                    route_id INT,
-                    route_name NVARCHAR(255),
-                    route_host NVARCHAR(255),
-                    route_endpoint NVARCHAR(500),
-                    route_caller_id NVARCHAR(50),
-                    billed_time NVARCHAR(20),
-                    billed_value NVARCHAR(50),
-                    qualification NVARCHAR(255),
-                    behavior NVARCHAR(255),
-                    readable_behavior_text NVARCHAR(500),
-                    phone_type NVARCHAR(50),
-                    recording NVARCHAR(500),
-                    recording_amd NVARCHAR(500),
-                    status_id INT,
-                    readable_status_text NVARCHAR(500),
-                    readable_amd_status_text NVARCHAR(500),
-                    mode NVARCHAR(50),
-                    hangup_cause INT,
-                    sip_cause NVARCHAR(20),
-                    readable_hangup_cause_text NVARCHAR(500),
-                    feedback NVARCHAR(MAX),
-                    recorded BIT,
-                    ended_by_agent BIT,
-                    qualification_note NVARCHAR(MAX),
-                    sid NVARCHAR(255),
-                    is_dmc BIT,
-                    is_unknown BIT,
-                    is_transferred BIT,
-                    is_consult BIT,
-                    is_transfer BIT,
-                    is_conversion BIT,
-                    qualification_id INT,
-                    consult_cancelled BIT,
-                    recording_transfer NVARCHAR(500),
-                    recording_consult NVARCHAR(500),
-                    recording_after_consult_cancel NVARCHAR(500),
-                    ivr_digit_pressed NVARCHAR(50),
-                    record_name NVARCHAR(255),
-                    transcription NVARCHAR(MAX),
-                    ai_evaluation_status NVARCHAR(255),
-                    created_at DATETIME DEFAULT GETDATE(),
-                    updated_at DATETIME DEFAULT GETDATE()
-                )
-                PRINT 'Tabela calls criada com sucesso'
-            END
-            ELSE
-            BEGIN
-                PRINT 'Tabela calls já existe'
-            END
-            """
+            if current_version < 1:
+                # Tabela principal de chamadas
+                self.logger.info("📋 Criando tabela 'calls' se não existir...")
+                create_calls_table = """
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='calls' AND xtype='U')
+                BEGIN
+                    CREATE TABLE calls (
+                        id NVARCHAR(50) PRIMARY KEY,
+                        list_name NVARCHAR(255),
+                        number NVARCHAR(50),
+                        call_date DATETIME,
+                        call_date_rfc3339 NVARCHAR(50),
+                        campaign_id INT,
+                        campaign NVARCHAR(255),
+                        queue_id NVARCHAR(50),
+                        queue_name NVARCHAR(255),
+                        ring_group_id NVARCHAR(50),
+                        ring_group_name NVARCHAR(255),
+                        ivr_name NVARCHAR(255),
+                        receptive_name NVARCHAR(255),
+                        receptive_phone NVARCHAR(50),
+                        receptive_did NVARCHAR(50),
+                        has_agent BIT,
+                        agent NVARCHAR(255),
+                        acw_time NVARCHAR(20),
+                        speaking_time NVARCHAR(20),
+                        ivr_time NVARCHAR(20),
+                        ivr_after_call_time NVARCHAR(20),
+                        amd_time NVARCHAR(20),
+                        waiting_time NVARCHAR(20),
+                        speaking_with_agent_time NVARCHAR(20),
+                        route_id INT,
+                        route_name NVARCHAR(255),
+                        route_host NVARCHAR(255),
+                        route_endpoint NVARCHAR(500),
+                        route_caller_id NVARCHAR(50),
+                        billed_time NVARCHAR(20),
+                        billed_value NVARCHAR(50),
+                        qualification NVARCHAR(255),
+                        behavior NVARCHAR(255),
+                        readable_behavior_text NVARCHAR(500),
+                        phone_type NVARCHAR(50),
+                        recording NVARCHAR(500),
+                        recording_amd NVARCHAR(500),
+                        status_id INT,
+                        readable_status_text NVARCHAR(500),
+                        readable_amd_status_text NVARCHAR(500),
+                        mode NVARCHAR(50),
+                        hangup_cause INT,
+                        sip_cause NVARCHAR(20),
+                        readable_hangup_cause_text NVARCHAR(500),
+                        feedback NVARCHAR(MAX),
+                        recorded BIT,
+                        ended_by_agent BIT,
+                        qualification_note NVARCHAR(MAX),
+                        sid NVARCHAR(255),
+                        is_dmc BIT,
+                        is_unknown BIT,
+                        is_transferred BIT,
+                        is_consult BIT,
+                        is_transfer BIT,
+                        is_conversion BIT,
+                        qualification_id INT,
+                        consult_cancelled BIT,
+                        recording_transfer NVARCHAR(500),
+                        recording_consult NVARCHAR(500),
+                        recording_after_consult_cancel NVARCHAR(500),
+                        ivr_digit_pressed NVARCHAR(50),
+                        record_name NVARCHAR(255),
+                        transcription NVARCHAR(MAX),
+                        ai_evaluation_status NVARCHAR(255),
+                        created_at DATETIME DEFAULT GETDATE(),
+                        updated_at DATETIME DEFAULT GETDATE()
+                    )
+                    PRINT 'Tabela calls criada com sucesso'
+                END
+                ELSE
+                BEGIN
+                    PRINT 'Tabela calls já existe'
+                END
+                """
             
-            cursor.execute(create_calls_table)
+                cursor.execute(create_calls_table)
             
-            # Tabela de dados de mailing
-            self.logger.info("📋 Criando tabela 'mailing_data' se não existir...")
-            create_mailing_table = """
-            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='mailing_data' AND xtype='U')
-            BEGIN
-                CREATE TABLE mailing_data (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    _id NVARCHAR(50),
-                    call_id NVARCHAR(50),
-                    identifier NVARCHAR(50),
-                    campaign_id INT,
-                    company_id INT,
-                    list_id INT,
-                    uf NVARCHAR(10),
-                    phone NVARCHAR(50),
-                    dialed_phone INT,
-                    dialed_identifier INT,
-                    on_calling INT,
-                    column_position INT,
-                    row_position INT,
-                    estrategia NVARCHAR(255),
-                    razao_social NVARCHAR(255),
-                    nome_fantasia NVARCHAR(255),
-                    valor_conta NVARCHAR(100),
-                    cidade NVARCHAR(255),
-                    cep NVARCHAR(20),
-                    uf_mailing NVARCHAR(10),
-                    socio NVARCHAR(255),
-                    created_at DATETIME DEFAULT GETDATE(),
-                    updated_at DATETIME DEFAULT GETDATE(),
-                    FOREIGN KEY (call_id) REFERENCES calls(id) ON DELETE CASCADE
-                )
-                PRINT 'Tabela mailing_data criada com sucesso'
-            END
-            ELSE
-            BEGIN
-                PRINT 'Tabela mailing_data já existe'
-            END
-            """
+                # Tabela de dados de mailing
+                self.logger.info("📋 Criando tabela 'mailing_data' se não existir...")
+                create_mailing_table = """
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='mailing_data' AND xtype='U')
+                BEGIN
+                    CREATE TABLE mailing_data (
+                        id INT IDENTITY(1,1) PRIMARY KEY,
+                        _id NVARCHAR(50),
+                        call_id NVARCHAR(50),
+                        identifier NVARCHAR(50),
+                        campaign_id INT,
+                        company_id INT,
+                        list_id INT,
+                        uf NVARCHAR(10),
+                        phone NVARCHAR(50),
+                        dialed_phone INT,
+                        dialed_identifier INT,
+                        on_calling INT,
+                        column_position INT,
+                        row_position INT,
+                        estrategia NVARCHAR(255),
+                        razao_social NVARCHAR(255),
+                        nome_fantasia NVARCHAR(255),
+                        valor_conta NVARCHAR(100),
+                        cidade NVARCHAR(255),
+                        cep NVARCHAR(20),
+                        uf_mailing NVARCHAR(10),
+                        socio NVARCHAR(255),
+                        created_at DATETIME DEFAULT GETDATE(),
+                        updated_at DATETIME DEFAULT GETDATE(),
+                        FOREIGN KEY (call_id) REFERENCES calls(id) ON DELETE CASCADE
+                    )
+                    PRINT 'Tabela mailing_data criada com sucesso'
+                END
+                ELSE
+                BEGIN
+                    PRINT 'Tabela mailing_data já existe'
+                END
+                """
+            
+                cursor.execute(create_mailing_table)
+            
+                # Tabela de logs de execução
+                self.logger.info("📋 Criando tabela 'execution_logs' se não existir...")
+                create_logs_table = """
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='execution_logs' AND xtype='U')
+                BEGIN
+                    CREATE TABLE execution_logs (
+                        id INT IDENTITY(1,1) PRIMARY KEY,
+                        execution_date DATETIME,
+                        start_date NVARCHAR(50),
+                        end_date NVARCHAR(50),
+                        campaign_ids NVARCHAR(100),
+                        total_records INT DEFAULT 0,
+                        successful_records INT DEFAULT 0,
+                        failed_records INT DEFAULT 0,
+                        execution_time_seconds INT DEFAULT 0,
+                        status NVARCHAR(20) DEFAULT 'RUNNING',
+                        error_message NVARCHAR(MAX),
+                        created_at DATETIME DEFAULT GETDATE()
+                    )
+                    PRINT 'Tabela execution_logs criada com sucesso'
+                END
+                ELSE
+                BEGIN
+                    PRINT 'Tabela execution_logs já existe'
+                END
+                """
+            
+                cursor.execute(create_logs_table)
+            
+            if current_version < 2:
+                # Execuções registradas por conta 3C (multi-conta)
+                self.logger.info("📋 Adicionando coluna 'account_name' em 'execution_logs'...")
+                cursor.execute("""
+                IF COL_LENGTH('execution_logs', 'account_name') IS NULL
+                BEGIN
+                    ALTER TABLE execution_logs ADD account_name NVARCHAR(100) NULL
+                END
+                """)
+            
+            if current_version < 3:
+                # Hash de conteúdo por registro para detecção de alterações
+                self.logger.info("📋 Adicionando coluna 'row_hash' em 'calls'...")
+                cursor.execute("""
+                IF COL_LENGTH('calls', 'row_hash') IS NULL
+                BEGIN
+                    ALTER TABLE calls ADD row_hash CHAR(32) NULL
+                END
+                """)
+                cursor.execute("""
+                IF COL_LENGTH('execution_logs', 'inserted_records') IS NULL
+                BEGIN
+                    ALTER TABLE execution_logs ADD
+                        inserted_records INT DEFAULT 0,
+                        updated_records INT DEFAULT 0,
+                        unchanged_records INT DEFAULT 0
+                END
+                """)
+            
+            if current_version < 4:
+                # Tabela de agregados diários (dia x campanha x agente x status x qualificação)
+                self.logger.info("📋 Criando tabela 'calls_daily_rollup' se não existir...")
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='calls_daily_rollup' AND xtype='U')
+                BEGIN
+                    CREATE TABLE calls_daily_rollup (
+                        rollup_date DATE NOT NULL,
+                        campaign_id INT NOT NULL,
+                        agent NVARCHAR(255),
+                        readable_status_text NVARCHAR(500),
+                        qualification NVARCHAR(255),
+                        call_count INT NOT NULL,
+                        speaking_time_seconds BIGINT NOT NULL,
+                        speaking_with_agent_time_seconds BIGINT NOT NULL,
+                        waiting_time_seconds BIGINT NOT NULL,
+                        billed_time_seconds BIGINT NOT NULL,
+                        billed_value_sum DECIMAL(18, 4) NOT NULL,
+                        conversion_count INT NOT NULL,
+                        dmc_count INT NOT NULL,
+                        updated_at DATETIME DEFAULT GETDATE()
+                    )
+                    CREATE CLUSTERED INDEX IX_calls_daily_rollup_date_campaign ON calls_daily_rollup (rollup_date, campaign_id)
+                END
+                """)
+                # Índice usado pela atualização incremental dos agregados e pela reconciliação
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_calls_call_date_campaign' AND object_id=OBJECT_ID('calls'))
+                BEGIN
+                    CREATE INDEX IX_calls_call_date_campaign ON calls (call_date, campaign_id)
+                END
+                """)
+            
+            if current_version < 5:
+                # Status e caminho local das gravações baixadas
+                self.logger.info("📋 Criando tabela 'call_recordings' se não existir...")
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='call_recordings' AND xtype='U')
+                BEGIN
+                    CREATE TABLE call_recordings (
+                        call_id NVARCHAR(50) NOT NULL,
+                        kind NVARCHAR(30) NOT NULL,
+                        url NVARCHAR(500),
+                        local_path NVARCHAR(500),
+                        content_hash CHAR(64),
+                        size_bytes BIGINT,
+                        status NVARCHAR(20),
+                        error_message NVARCHAR(MAX),
+                        updated_at DATETIME DEFAULT GETDATE(),
+                        PRIMARY KEY (call_id, kind)
+                    )
+                END
+                """)
+            
+            if current_version < 6:
+                # Unidades de trabalho (conta, dia, campanha) reivindicadas pelas instâncias
+                self.logger.info("📋 Criando tabela 'work_leases' se não existir...")
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='work_leases' AND xtype='U')
+                BEGIN
+                    CREATE TABLE work_leases (
+                        run_key NVARCHAR(100) NOT NULL,
+                        account_name NVARCHAR(100) NOT NULL,
+                        window_start DATETIME NOT NULL,
+                        window_end DATETIME NOT NULL,
+                        campaign_id INT NOT NULL,
+                        status NVARCHAR(20) NOT NULL DEFAULT 'PENDING',
+                        owner NVARCHAR(200),
+                        lease_expires_at DATETIME,
+                        heartbeat_at DATETIME,
+                        attempts INT NOT NULL DEFAULT 0,
+                        error_message NVARCHAR(MAX),
+                        created_at DATETIME DEFAULT GETDATE(),
+                        completed_at DATETIME,
+                        PRIMARY KEY (run_key, account_name, window_start, campaign_id)
+                    )
+                END
+                """)
+            
+            if current_version < 7:
+                # Tabelas de arquivo da retenção (mesmas colunas das tabelas quentes)
+                self.logger.info("📋 Criando tabelas 'calls_archive' e 'mailing_data_archive' se não existirem...")
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='calls_archive' AND xtype='U')
+                BEGIN
+                    SELECT TOP 0 * INTO calls_archive FROM calls
+                END
+                """)
+                cursor.execute("""
+                IF COL_LENGTH('calls_archive', 'archived_at') IS NULL
+                BEGIN
+                    ALTER TABLE calls_archive ADD archived_at DATETIME NOT NULL DEFAULT GETDATE()
+                    ALTER TABLE calls_archive ADD CONSTRAINT PK_calls_archive PRIMARY KEY (id)
+                END
+                """)
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='mailing_data_archive' AND xtype='U')
+                BEGIN
+                    SELECT TOP 0 * INTO mailing_data_archive FROM mailing_data
+                END
+                """)
+                cursor.execute("""
+                IF COL_LENGTH('mailing_data_archive', 'archived_at') IS NULL
+                BEGIN
+                    ALTER TABLE mailing_data_archive ADD archived_at DATETIME NOT NULL DEFAULT GETDATE()
+                END
+                """)
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_mailing_data_archive_call_id' AND object_id=OBJECT_ID('mailing_data_archive'))
+                BEGIN
+                    CREATE INDEX IX_mailing_data_archive_call_id ON mailing_data_archive (call_id)
+                END
+                """)
+                # Remoções por call_id (retenção e regravação de registros alterados) sem varrer a tabela
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='IX_mailing_data_call_id' AND object_id=OBJECT_ID('mailing_data'))
+                BEGIN
+                    CREATE INDEX IX_mailing_data_call_id ON mailing_data (call_id)
+                END
+                """)
+                
+                # Progresso e contagens de cada execução da retenção
+                self.logger.info("📋 Criando tabela 'retention_runs' se não existir...")
+                cursor.execute("""
+                IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='retention_runs' AND xtype='U')
+                BEGIN
+                    CREATE TABLE retention_runs (
+                        id INT IDENTITY(1,1) PRIMARY KEY,
+                        started_at DATETIME DEFAULT GETDATE(),
+                        finished_at DATETIME,
+                        calls_cutoff DATETIME,
+                        logs_cutoff DATETIME,
+                        archived BIT,
+                        status NVARCHAR(20) DEFAULT 'RUNNING',
+                        chunks INT DEFAULT 0,
+                        calls_removed INT DEFAULT 0,
+                        mailing_removed INT DEFAULT 0,
+                        recordings_removed INT DEFAULT 0,
+                        execution_logs_removed INT DEFAULT 0,
+                        work_leases_removed INT DEFAULT 0,
+                        error_message NVARCHAR(MAX)
+                    )
+                END
+                """)
             
-            cursor.execute(create_mailing_table)
+            if current_version < 8:
+                # Tentativas e espera (backoff) das gravações com falha
+                self.logger.info("📋 Adicionando colunas de nova tentativa em 'call_recordings'...")
+                cursor.execute("""
+                IF COL_LENGTH('call_recordings', 'attempts') IS NULL
+                BEGIN
+                    ALTER TABLE call_recordings ADD
+                        attempts INT NOT NULL DEFAULT 0,
+                        next_attempt_at DATETIME NULL
+                END
+                """)
             
-            # Tabela de logs de execução
-            self.logger.info("📋 Criando tabela 'execution_logs' se não existir...")
-            create_logs_table = """
-            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='execution_logs' AND xtype='U')
+            # Registra a versão aplicada para pular a DDL nas próximas partidas
+            cursor.execute("""
+            IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='schema_version' AND xtype='U')
             BEGIN
-                CREATE TABLE execution_logs (
-                    id INT IDENTITY(1,1) PRIMARY KEY,
-                    execution_date DATETIME,
-                    start_date NVARCHAR(50),
-                    end_date NVARCHAR(50),
-                    campaign_ids NVARCHAR(100),
-                    total_records INT DEFAULT 0,
-                    successful_records INT DEFAULT 0,
-                    failed_records INT DEFAULT 0,
-                    execution_time_seconds INT DEFAULT 0,
-                    status NVARCHAR(20) DEFAULT 'RUNNING',
-                    error_message NVARCHAR(MAX),
-                    created_at DATETIME DEFAULT GETDATE()
+                CREATE TABLE schema_version (
+                    version INT PRIMARY KEY,
+                    applied_at DATETIME DEFAULT GETDATE()
                 )
-                PRINT 'Tabela execution_logs criada com sucesso'
             END
-            ELSE
-            BEGIN
-                PRINT 'Tabela execution_logs já existe'
-            END
-            """
-            
-            cursor.execute(create_logs_table)
+            """)
+            cursor.execute(
+                "IF NOT EXISTS (SELECT 1 FROM schema_version WHERE version = ?) INSERT INTO schema_version (version) VALUES (?)",
+                (SCHEMA_VERSION, SCHEMA_VERSION)
+            )
             
             self.connection.commit() # type: ignore
-            self.logger.info("✅ Todas as tabelas foram verificadas/criadas com sucesso!")
+            self.logger.info(f"✅ Todas as tabelas foram verificadas/criadas com sucesso! (schema v{SCHEMA_VERSION})")
             
         except Exception as e:
             self.logger.error(f"❌ Erro ao criar tabelas: {e}")
@@ -348,9 +713,755 @@ class LogManager:
         return logger
 
 
+class RecordingDownloader:
+    """
+    Pipeline de download das gravações das chamadas em segundo plano.
+    Um pool limitado de threads baixa os arquivos em streaming para um armazenamento
+    endereçado por conteúdo (SHA-256), retomando downloads parciais; uma thread
+    dedicada, com conexão própria, registra o status de cada gravação em call_recordings.
+    Falhas são repetidas nas execuções seguintes com espera exponencial (retry_minutes,
+    2x, 4x...) até max_attempts; downloads parciais órfãos são retomados pelo arquivo
+    .json gravado ao lado de cada .part. A busca dessas gravações pendentes roda em uma
+    thread própria, com conexão própria, no máximo uma vez a cada backlog_interval_minutes
+    por conta, sem atrasar a sincronização principal.
+    """
+    
+    CHUNK_SIZE = 64 * 1024
+    # Locks por URL distribuídos em faixas fixas (pelo hash da URL), sem crescer com o histórico
+    URL_LOCK_STRIPES = 64
+    
+    def __init__(self, db_config: Dict[str, str], logger: logging.Logger, storage_dir: str,
+                 max_workers: int = 4, timeout: int = 120, max_attempts: int = 5, retry_minutes: int = 15,
+                 backlog_days: int = 7, backlog_limit: int = 1000, backlog_interval_minutes: int = 60):
+        # Importados sob demanda: o pipeline só existe com RECORDINGS_ENABLED=true
+        import queue
+        import threading
+        from concurrent.futures import ThreadPoolExecutor
+        
+        self.logger = logger
+        self.storage_dir = os.path.abspath(storage_dir)
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_minutes = retry_minutes
+        self.backlog_days = backlog_days
+        self.backlog_limit = backlog_limit
+        self.backlog_interval_minutes = backlog_interval_minutes
+        # Gravações na fila ou em download, para não enfileirar a mesma duas vezes
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        self.partials_resumed = False
+        # Última busca de pendentes por (conta, campanhas), em time.monotonic()
+        self.backlog_swept = {}
+        self.db_manager = DatabaseManager(db_config, logger)
+        self.backlog_db_manager = DatabaseManager(db_config, logger)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='recording')
+        self.backlog_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='recording-backlog')
+        self.results = queue.Queue()
+        self.thread_local = threading.local()
+        self.url_locks = [threading.Lock() for _ in range(self.URL_LOCK_STRIPES)]
+        self.counters = {'DOWNLOADED': 0, 'DUPLICATE': 0, 'FAILED': 0}
+        
+        for subdir in ('objects', 'partial', 'urls'):
+            os.makedirs(os.path.join(self.storage_dir, subdir), exist_ok=True)
+        
+        self.writer = threading.Thread(target=self._status_writer, name='recording-status', daemon=True)
+        self.writer.start()
+        self.logger.info(f"🎙️ Download de gravações ativo: {max_workers} workers | destino: {self.storage_dir}")
+    
+    def submit_calls(self, rows: List[Dict], account: Dict):
+        """Enfileira as gravações dos registros gravados (não bloqueia)"""
+        for row in rows:
+            for kind in RECORDING_COLUMNS:
+                url = row['call_values'][CALL_COLUMNS.index(kind)]
+                if url:
+                    self.submit(row['id'], kind, url, account)
+    
+    def submit(self, call_id: str, kind: str, url: str, account: Dict) -> bool:
+        """Enfileira uma gravação, se ela ainda não estiver na fila; retorna se foi enfileirada"""
+        key = (call_id, kind)
+        with self.pending_lock:
+            if key in self.pending:
+                return False
+            self.pending.add(key)
+        self.executor.submit(self._download_task, call_id, kind, url, account)
+        return True
+    
+    def resume_partials(self, accounts: List[Dict]) -> int:
+        """
+        Re-enfileira (uma vez por processo) os downloads parciais deixados por execuções
+        anteriores interrompidas, a partir do .json gravado ao lado de cada .part
+        Returns: quantidade de downloads re-enfileirados
+        """
+        if self.partials_resumed:
+            return 0
+        self.partials_resumed = True
+        
+        accounts_by_name = {account['name']: account for account in accounts}
+        partial_dir = os.path.join(self.storage_dir, 'partial')
+        resumed = 0
+        for file_name in os.listdir(partial_dir):
+            if not file_name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(partial_dir, file_name), encoding='utf-8') as f:
+                    pending = json.load(f)
+            except (OSError, ValueError) as e:
+                self.logger.warning(f"⚠️ Download parcial ilegível ({file_name}): {e}")
+                continue
+            account = accounts_by_name.get(pending.get('account'))
+            if account and self.submit(pending['call_id'], pending['kind'], pending['url'], account):
+                resumed += 1
+        
+        if resumed:
+            self.logger.info(f"🎙️ {resumed} download(s) parcial(is) de execuções anteriores re-enfileirado(s)")
+        return resumed
+    
+    def sweep_backlog(self, account: Dict, campaign_ids: str) -> bool:
+        """
+        Agenda em segundo plano a busca das gravações pendentes da conta: nas chamadas dos
+        últimos backlog_days dias das campanhas, gravações sem status em call_recordings ou
+        com falha elegível para nova tentativa. Repetições dentro de backlog_interval_minutes
+        (outras janelas ou unidades da mesma execução) são ignoradas
+        Returns: se a busca foi agendada
+        """
+        key = (account['name'], campaign_ids)
+        last_sweep = self.backlog_swept.get(key)
+        if last_sweep is not None and time.monotonic() - last_sweep < self.backlog_interval_minutes * 60:
+            return False
+        self.backlog_swept[key] = time.monotonic()
+        self.backlog_executor.submit(self._sweep_backlog_task, account, campaign_ids)
+        return True
+    
+    def _sweep_backlog_task(self, account: Dict, campaign_ids: str):
+        """Consulta as gravações pendentes (conexão própria) e as enfileira para download"""
+        campaign_list = [int(campaign_id) for campaign_id in campaign_ids.split(',') if campaign_id.strip()]
+        if not campaign_list:
+            return
+        
+        since = datetime.now() - timedelta(days=self.backlog_days)
+        backlog_sql = RECORDING_BACKLOG_SQL.format(campaign_placeholders=', '.join('?' for _ in campaign_list))
+        try:
+            cursor = self.backlog_db_manager.get_connection().cursor()
+            try:
+                cursor.execute(backlog_sql, (self.backlog_limit, since, self.max_attempts, *campaign_list))
+                rows = cursor.fetchall()
+            finally:
+                cursor.close()
+        except Exception as e:
+            self.logger.error(f"❌ [{account['name']}] Erro ao consultar gravações pendentes: {e}")
+            return
+        
+        queued = sum(1 for call_id, kind, url in rows if self.submit(call_id, kind, url, account))
+        if queued:
+            self.logger.info(f"🎙️ [{account['name']}] {queued} gravação(ões) pendente(s) ou com falha re-enfileirada(s)")
+    
+    def close(self, cancel_pending: bool = False):
+        """
+        Aguarda os downloads pendentes e o registro dos status
+        cancel_pending: descarta os downloads ainda na fila (interrupção) e aguarda apenas os
+        em andamento; os descartados voltam pela busca de pendentes ou pelo .json dos parciais
+        """
+        if cancel_pending:
+            self.logger.info("🎙️ Interrompido: aguardando apenas os downloads de gravações em andamento...")
+        else:
+            self.logger.info("🎙️ Aguardando downloads de gravações pendentes...")
+        self.backlog_executor.shutdown(wait=True, cancel_futures=cancel_pending)
+        self.backlog_db_manager.close_connection()
+        self.executor.shutdown(wait=True, cancel_futures=cancel_pending)
+        self.results.put(None)
+        self.writer.join()
+        self.logger.info(f"🎙️ Gravações - baixadas: {self.counters['DOWNLOADED']} | "
+                         f"duplicadas: {self.counters['DUPLICATE']} | falhas: {self.counters['FAILED']}")
+    
+    def _get_session(self):
+        """Sessão HTTP por thread (requests.Session não é thread-safe)"""
+        if not hasattr(self.thread_local, 'session'):
+            import requests
+            self.thread_local.session = requests.Session()
+        return self.thread_local.session
+    
+    def _url_lock(self, url_key: str) -> 'threading.Lock':
+        return self.url_locks[int(url_key[:8], 16) % self.URL_LOCK_STRIPES]
+    
+    def _object_path(self, content_hash: str, extension: str) -> str:
+        return os.path.join(self.storage_dir, 'objects', content_hash[:2], content_hash[2:4], content_hash + extension)
+    
+    def _download_task(self, call_id: str, kind: str, url: str, account: Dict):
+        """Baixa uma gravação e publica o resultado para a thread de status"""
+        result = {'call_id': call_id, 'kind': kind, 'url': url, 'local_path': None,
+                  'content_hash': None, 'size_bytes': None, 'status': 'FAILED', 'error_message': None}
+        try:
+            result.update(self._download(call_id, kind, url, account))
+        except Exception as e:
+            result['error_message'] = str(e)
+            self.logger.warning(f"⚠️ Falha ao baixar gravação {kind} da chamada {call_id}: {e}")
+        finally:
+            with self.pending_lock:
+                self.pending.discard((call_id, kind))
+        self.results.put(result)
+    
+    def _download(self, call_id: str, kind: str, url: str, account: Dict) -> Dict:
+        """
+        Faz o download em streaming para um arquivo parcial (retomado com Range se
+        já existir), calcula o SHA-256 e move para o armazenamento por conteúdo
+        """
+        url_key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        index_path = os.path.join(self.storage_dir, 'urls', url_key)
+        partial_path = os.path.join(self.storage_dir, 'partial', url_key + '.part')
+        pending_path = os.path.join(self.storage_dir, 'partial', url_key + '.json')
+        extension = os.path.splitext(urlparse(url).path)[1] or '.mp3'
+        
+        with self._url_lock(url_key):
+            # URL já baixada anteriormente: não baixa de novo
+            if os.path.exists(index_path):
+                with open(index_path, encoding='utf-8') as f:
+                    content_hash = f.read().strip()
+                object_path = self._object_path(content_hash, extension)
+                if os.path.exists(object_path):
+                    if os.path.exists(pending_path):
+                        os.remove(pending_path)
+                    return {'local_path': object_path, 'content_hash': content_hash,
+                            'size_bytes': os.path.getsize(object_path), 'status': 'DUPLICATE'}
+            
+            # Identifica o download parcial para retomá-lo se o processo for interrompido
+            if not os.path.exists(pending_path):
+                with open(pending_path, 'w', encoding='utf-8') as f:
+                    json.dump({'call_id': call_id, 'kind': kind, 'url': url, 'account': account['name']}, f)
+            
+            # O token da conta só é enviado para o mesmo host da API
+            params = {}
+            if urlparse(url).netloc == urlparse(account.get('base_url') or '').netloc and 'api_token=' not in url:
+                params['api_token'] = account['manager_token']
+            
+            digest = hashlib.sha256()
+            offset = os.path.getsize(partial_path) if os.path.exists(partial_path) else 0
+            headers = {'Range': f'bytes={offset}-'} if offset else {}
+            
+            with self._get_session().get(url, params=params, headers=headers, stream=True, timeout=self.timeout) as response:
+                resumed = offset and response.status_code in (206, 416)
+                if resumed:
+                    # Retomada (ou parcial já completo - 416): o hash inclui os bytes já baixados
+                    with open(partial_path, 'rb') as f:
+                        for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                            digest.update(chunk)
+                else:
+                    response.raise_for_status()
+                
+                if response.status_code != 416:
+                    with open(partial_path, 'ab' if resumed else 'wb') as f:
+                        for chunk in response.iter_content(chunk_size=self.CHUNK_SIZE):
+                            if chunk:
+                                digest.update(chunk)
+                                f.write(chunk)
+            
+            content_hash = digest.hexdigest()
+            object_path = self._object_path(content_hash, extension)
+            status = 'DOWNLOADED'
+            if os.path.exists(object_path):
+                # Conteúdo idêntico já armazenado (outra URL): descarta a cópia
+                os.remove(partial_path)
+                status = 'DUPLICATE'
+            else:
+                os.makedirs(os.path.dirname(object_path), exist_ok=True)
+                os.replace(partial_path, object_path)
+            
+            index_tmp = index_path + '.tmp'
+            with open(index_tmp, 'w', encoding='utf-8') as f:
+                f.write(content_hash)
+            os.replace(index_tmp, index_path)
+            os.remove(pending_path)
+            
+            return {'local_path': object_path, 'content_hash': content_hash,
+                    'size_bytes': os.path.getsize(object_path), 'status': status}
+    
+    def _status_writer(self):
+        """Thread única que grava o status das gravações com uma conexão própria"""
+        # Falhas incrementam attempts e agendam a próxima tentativa (retry_minutes * 2^tentativas)
+        upsert_sql = """
+        MERGE call_recordings AS target
+        USING (SELECT ? AS call_id, ? AS kind, ? AS url, ? AS local_path, ? AS content_hash,
+                      ? AS size_bytes, ? AS status, ? AS error_message, ? AS retry_minutes) AS source
+        ON target.call_id = source.call_id AND target.kind = source.kind
+        WHEN MATCHED THEN
+            UPDATE SET url = source.url, local_path = source.local_path, content_hash = source.content_hash,
+                       size_bytes = source.size_bytes, status = source.status,
+                       error_message = source.error_message, updated_at = GETDATE(),
+                       attempts = CASE WHEN source.status = 'FAILED' THEN target.attempts + 1 ELSE 0 END,
+                       next_attempt_at = CASE WHEN source.status = 'FAILED'
+                           THEN DATEADD(MINUTE, source.retry_minutes * POWER(2, target.attempts), GETDATE()) END
+        WHEN NOT MATCHED THEN
+            INSERT (call_id, kind, url, local_path, content_hash, size_bytes, status, error_message,
+                    attempts, next_attempt_at)
+            VALUES (source.call_id, source.kind, source.url, source.local_path, source.content_hash,
+                    source.size_bytes, source.status, source.error_message,
+                    CASE WHEN source.status = 'FAILED' THEN 1 ELSE 0 END,
+                    CASE WHEN source.status = 'FAILED' THEN DATEADD(MINUTE, source.retry_minutes, GETDATE()) END);
+        """
+        while True:
+            result = self.results.get()
+            if result is None:
+                break
+            
+            self.counters[result['status']] += 1
+            values = (result['call_id'], result['kind'], result['url'], result['local_path'],
+                      result['content_hash'], result['size_bytes'], result['status'], result['error_message'],
+                      self.retry_minutes)
+            try:
+                connection = self.db_manager.get_connection()
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(upsert_sql, values)
+                    connection.commit()
+                finally:
+                    cursor.close()
+            except Exception as e:
+                self.logger.error(f"❌ Erro ao registrar status da gravação {result['kind']} da chamada {result['call_id']}: {e}")
+                self.db_manager.close_connection()
+        
+        self.db_manager.close_connection()
+
+
+class WorkLeaseManager:
+    """
+    Coordenação de várias instâncias do robô no mesmo banco pela tabela work_leases.
+    Cada execução é dividida em unidades (conta, dia, campanha) que as instâncias
+    reivindicam com leases que expiram. Uma thread de heartbeat renova o lease enquanto
+    a unidade é processada; leases expirados (instância morta) são assumidos por outra
+    instância. Unidades com falha só voltam a ser reivindicadas após uma espera
+    exponencial (retry_backoff_seconds * 2^(tentativas-1)); ao esgotar max_attempts
+    ficam FAILED e são reportadas como incompletas. Os horários usam o relógio do banco
+    (GETDATE()), não o de cada host.
+    """
+    
+    def __init__(self, db_config: Dict[str, str], logger: logging.Logger, instance_id: str,
+                 lease_seconds: int = 300, heartbeat_seconds: int = 60, max_attempts: int = 3,
+                 retry_backoff_seconds: int = 60):
+        # Importado sob demanda: a coordenação só existe com LEASES_ENABLED=true
+        import threading
+        
+        self.logger = logger
+        self.instance_id = instance_id
+        self.lease_seconds = lease_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.max_attempts = max_attempts
+        self.retry_backoff_seconds = retry_backoff_seconds
+        # Conexão própria: o heartbeat roda em outra thread e não pode interferir
+        # nas transações de gravação da conexão principal
+        self.db_manager = DatabaseManager(db_config, logger)
+        self.lock = threading.Lock()
+        self.logger.info(f"🤝 Coordenação por leases ativa: instância {instance_id} | lease de {lease_seconds}s | "
+                         f"heartbeat a cada {heartbeat_seconds}s")
+    
+    def _execute(self, sql: str, params, fetch: bool = False, many: bool = False):
+        """Executa um comando na conexão dos leases e faz commit; retorna as linhas ou o rowcount"""
+        with self.lock:
+            connection = self.db_manager.get_connection()
+            try:
+                cursor = connection.cursor()
+                try:
+                    if many:
+                        cursor.executemany(sql, params)
+                    else:
+                        cursor.execute(sql, params)
+                    result = cursor.fetchall() if fetch else cursor.rowcount
+                finally:
+                    cursor.close()
+                connection.commit()
+                return result
+            except Exception:
+                # Descarta a conexão (pode ter caído); a próxima chamada reconecta
+                self.db_manager.close_connection()
+                raise
+    
+    def ensure_units(self, run_key: str, units: List[Tuple[str, datetime, datetime, int]]):
+        """Registra as unidades da execução (idempotente entre instâncias concorrentes)"""
+        insert_sql = """
+        INSERT INTO work_leases (run_key, account_name, window_start, window_end, campaign_id)
+        SELECT ?, ?, ?, ?, ?
+        WHERE NOT EXISTS (
+            SELECT 1 FROM work_leases WITH (UPDLOCK, HOLDLOCK)
+            WHERE run_key = ? AND account_name = ? AND window_start = ? AND campaign_id = ?
+        )
+        """
+        params = [
+            (run_key, account_name, window_start, window_end, campaign_id,
+             run_key, account_name, window_start, campaign_id)
+            for account_name, window_start, window_end, campaign_id in units
+        ]
+        if params:
+            self._execute(insert_sql, params, many=True)
+    
+    def claim(self, run_key: str, account_names: List[str]) -> Optional[Dict]:
+        """
+        Reivindica atomicamente uma unidade pendente, com falha (abaixo do limite de
+        tentativas e após a espera) ou com lease expirado. READPAST faz instâncias
+        concorrentes pularem as linhas já bloqueadas em vez de esperar por elas.
+        """
+        placeholders = ', '.join('?' for _ in account_names)
+        
+        # Lease expirado na última tentativa permitida: a unidade não será mais assumida
+        expired = self._execute(f"""
+        UPDATE work_leases
+        SET status = 'FAILED', lease_expires_at = NULL, completed_at = GETDATE(),
+            error_message = CONCAT('Lease expirado na última tentativa (instância ', owner, ')')
+        WHERE run_key = ? AND account_name IN ({placeholders}) AND status = 'RUNNING'
+          AND lease_expires_at < GETDATE() AND attempts >= ?
+        """, (run_key, *account_names, self.max_attempts))
+        if expired:
+            self.logger.error(f"❌ {expired} unidade(s) com lease expirado na última tentativa marcada(s) como FAILED")
+        
+        claim_sql = f"""
+        WITH candidate AS (
+            SELECT TOP (1) * FROM work_leases WITH (UPDLOCK, READPAST, ROWLOCK)
+            WHERE run_key = ? AND account_name IN ({placeholders}) AND attempts < ?
+              AND (status = 'PENDING'
+                   OR (status = 'FAILED' AND completed_at <= DATEADD(SECOND, -? * POWER(2, attempts - 1), GETDATE()))
+                   OR (status = 'RUNNING' AND lease_expires_at < GETDATE()))
+            ORDER BY attempts, window_start, campaign_id
+        )
+        UPDATE candidate
+        SET status = 'RUNNING', owner = ?, attempts = attempts + 1,
+            lease_expires_at = DATEADD(SECOND, ?, GETDATE()), heartbeat_at = GETDATE()
+        OUTPUT inserted.account_name, inserted.window_start, inserted.window_end, inserted.campaign_id,
+               inserted.attempts, deleted.status, deleted.owner;
+        """
+        rows = self._execute(claim_sql, (run_key, *account_names, self.max_attempts, self.retry_backoff_seconds,
+                                         self.instance_id, self.lease_seconds), fetch=True)
+        if not rows:
+            return None
+        
+        account_name, window_start, window_end, campaign_id, attempts, previous_status, previous_owner = rows[0]
+        if previous_status == 'RUNNING':
+            self.logger.warning(f"🤝 Lease expirado de {previous_owner} assumido: [{account_name}] "
+                                f"{window_start:%Y-%m-%d} campanha {campaign_id}")
+        return {
+            'run_key': run_key,
+            'account_name': account_name,
+            'window_start': window_start,
+            'window_end': window_end,
+            'campaign_id': int(campaign_id),
+            'attempts': int(attempts)
+        }
+    
+    def count_waiting(self, run_key: str, account_names: List[str]) -> int:
+        """
+        Quantidade de unidades da execução que ainda podem ser concluídas: com lease em
+        outras instâncias (válido, ou expirado com tentativas restantes) ou com falha
+        aguardando a espera para nova tentativa
+        """
+        placeholders = ', '.join('?' for _ in account_names)
+        rows = self._execute(f"""
+        SELECT COUNT(*) FROM work_leases
+        WHERE run_key = ? AND account_name IN ({placeholders})
+          AND ((status = 'RUNNING' AND owner <> ? AND (lease_expires_at >= GETDATE() OR attempts < ?))
+               OR (status = 'FAILED' AND attempts < ?))
+        """, (run_key, *account_names, self.instance_id, self.max_attempts, self.max_attempts), fetch=True)
+        return int(rows[0][0])
+    
+    def list_unfinished(self, run_key: str, account_names: List[str]) -> List[Tuple]:
+        """Unidades da execução que não foram concluídas (account_name, window_start, campaign_id, status, attempts, error_message)"""
+        placeholders = ', '.join('?' for _ in account_names)
+        return self._execute(f"""
+        SELECT account_name, window_start, campaign_id, status, attempts, error_message FROM work_leases
+        WHERE run_key = ? AND account_name IN ({placeholders}) AND status <> 'DONE'
+        ORDER BY account_name, window_start, campaign_id
+        """, (run_key, *account_names), fetch=True)
+    
+    @contextlib.contextmanager
+    def hold(self, unit: Dict):
+        """Mantém o lease da unidade renovado (heartbeat) enquanto o bloco executa"""
+        renew_sql = """
+        UPDATE work_leases
+        SET lease_expires_at = DATEADD(SECOND, ?, GETDATE()), heartbeat_at = GETDATE()
+        WHERE run_key = ? AND account_name = ? AND window_start = ? AND campaign_id = ?
+          AND owner = ? AND status = 'RUNNING'
+        """
+        import threading
+        
+        stop = threading.Event()
+        
+        def heartbeat():
+            while not stop.wait(self.heartbeat_seconds):
+                try:
+                    renewed = self._execute(renew_sql, (self.lease_seconds, unit['run_key'], unit['account_name'],
+                                                        unit['window_start'], unit['campaign_id'], self.instance_id))
+                except Exception as e:
+                    self.logger.error(f"❌ Erro ao renovar lease: {e}")
+                    continue
+                if not renewed:
+                    self.logger.warning(f"⚠️ Lease perdido para outra instância: [{unit['account_name']}] "
+                                        f"{unit['window_start']:%Y-%m-%d} campanha {unit['campaign_id']}")
+                    return
+        
+        thread = threading.Thread(target=heartbeat, name='lease-heartbeat', daemon=True)
+        thread.start()
+        try:
+            yield
+        finally:
+            stop.set()
+            thread.join()
+    
+    def complete(self, unit: Dict, success: bool, error_message: Optional[str] = None):
+        """Finaliza a unidade como DONE ou FAILED (FAILED volta a ser reivindicável)"""
+        updated = self._execute("""
+        UPDATE work_leases
+        SET status = ?, error_message = ?, lease_expires_at = NULL, completed_at = GETDATE()
+        WHERE run_key = ? AND account_name = ? AND window_start = ? AND campaign_id = ? AND owner = ?
+        """, ('DONE' if success else 'FAILED', error_message, unit['run_key'], unit['account_name'],
+              unit['window_start'], unit['campaign_id'], self.instance_id))
+        if not updated:
+            self.logger.warning(f"⚠️ Unidade já assumida por outra instância ao finalizar: [{unit['account_name']}] "
+                                f"{unit['window_start']:%Y-%m-%d} campanha {unit['campaign_id']}")
+    
+    def close(self):
+        self.db_manager.close_connection()
+
+
+class RunProfiler:
+    """
+    Ganchos opcionais de profiling de uma execução, controlados por variáveis de ambiente:
+    PROFILE_CPU=cprofile (cProfile em toda a execução), PROFILE_MEMORY=true (snapshots do
+    tracemalloc a cada página) e PROFILE_TIMINGS=true (tempo por etapa: fetch/transform/write).
+    Desligado, cada gancho é apenas uma verificação de flag.
+    """
+    
+    _NULL_STAGE = contextlib.nullcontext()
+    
+    def __init__(self, logger: logging.Logger, cpu: bool = False, memory: bool = False,
+                 timings: bool = False, log_dir: str = 'logs'):
+        self.logger = logger
+        self.cpu = cpu
+        self.memory = memory
+        self.timings = timings
+        self.enabled = cpu or memory or timings
+        self.log_dir = log_dir
+        self.file_prefix = None
+        self.cpu_profile = None
+        self.stage_timings = {}
+        self.memory_lines = []
+    
+    @classmethod
+    def from_env(cls, logger: logging.Logger) -> 'RunProfiler':
+        """Cria o profiler a partir de PROFILE_CPU, PROFILE_MEMORY e PROFILE_TIMINGS"""
+        return cls(
+            logger,
+            cpu=os.getenv('PROFILE_CPU', 'off').lower() == 'cprofile',
+            memory=os.getenv('PROFILE_MEMORY', 'false').lower() == 'true',
+            timings=os.getenv('PROFILE_TIMINGS', 'false').lower() == 'true'
+        )
+    
+    def start(self, log_ids: List[Optional[int]]):
+        """Inicia os ganchos ativos; os arquivos são nomeados pelos IDs de execution_logs"""
+        if not self.enabled:
+            return
+        
+        run_label = '-'.join(str(log_id) for log_id in log_ids if log_id is not None) or 'sem_id'
+        self.file_prefix = os.path.join(self.log_dir, f"exec{run_label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
+        self.stage_timings = {}
+        self.memory_lines = []
+        self.logger.info(f"🔬 Profiling ativo (cpu={self.cpu}, memória={self.memory}, etapas={self.timings}) - "
+                         f"saída em {self.file_prefix}_*")
+        
+        if self.memory:
+            import tracemalloc
+            tracemalloc.start()
+        if self.cpu:
+            import cProfile
+            self.cpu_profile = cProfile.Profile()
+            self.cpu_profile.enable()
+    
+    def stage(self, name: str):
+        """Context manager que acumula o tempo de uma etapa (sem custo quando desligado)"""
+        if not self.timings:
+            return self._NULL_STAGE
+        return self._timed_stage(name)
+    
+    @contextlib.contextmanager
+    def _timed_stage(self, name: str):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            stage = self.stage_timings.setdefault(name, {'calls': 0, 'seconds': 0.0})
+            stage['calls'] += 1
+            stage['seconds'] += time.perf_counter() - started
+    
+    def page_boundary(self, label: str):
+        """Registra um snapshot do tracemalloc ao final de cada página"""
+        if not self.memory:
+            return
+        
+        import tracemalloc
+        current, peak = tracemalloc.get_traced_memory()
+        top_stats = tracemalloc.take_snapshot().statistics('lineno')[:5]
+        self.memory_lines.append(f"[{datetime.now().strftime('%H:%M:%S')}] {label} | "
+                                 f"atual={current / 1024:.0f} KiB | pico={peak / 1024:.0f} KiB")
+        self.memory_lines.extend(f"    {stat}" for stat in top_stats)
+    
+    def stop(self):
+        """Encerra os ganchos e grava os arquivos de saída em logs/"""
+        if not self.enabled or self.file_prefix is None:
+            return
+        
+        try:
+            if self.cpu_profile is not None:
+                import io
+                import pstats
+                self.cpu_profile.disable()
+                self.cpu_profile.dump_stats(f"{self.file_prefix}_cpu.prof")
+                summary = io.StringIO()
+                pstats.Stats(self.cpu_profile, stream=summary).sort_stats('cumulative').print_stats(40)
+                with open(f"{self.file_prefix}_cpu.txt", 'w', encoding='utf-8') as f:
+                    f.write(summary.getvalue())
+                self.cpu_profile = None
+            
+            if self.memory:
+                import tracemalloc
+                tracemalloc.stop()
+                with open(f"{self.file_prefix}_memory.txt", 'w', encoding='utf-8') as f:
+                    f.write('\n'.join(self.memory_lines) + '\n')
+            
+            if self.timings:
+                with open(f"{self.file_prefix}_timings.json", 'w', encoding='utf-8') as f:
+                    json.dump(self.stage_timings, f, indent=2)
+                for name, stage in self.stage_timings.items():
+                    self.logger.info(f"🔬 Etapa {name}: {stage['seconds']:.3f}s em {stage['calls']} chamada(s)")
+            
+            self.logger.info(f"🔬 Arquivos de profiling gravados em {self.file_prefix}_*")
+        except Exception as e:
+            self.logger.error(f"❌ Erro ao gravar arquivos de profiling: {e}")
+        finally:
+            self.file_prefix = None
+
+
+class PageSizeTuner:
+    """
+    Ajuste adaptativo de per_page entre min_size e max_size, buscando que cada página
+    leve cerca de target_seconds. A partir das médias móveis (EWMA) de segundos e bytes
+    por registro, dobra o tamanho quando a página dobrada ainda caberia no alvo de
+    latência e no limite de bytes. Reduz à metade quando a página passa do alvo ou do
+    limite, ou quando a requisição falha; com muitos erros recentes não volta a crescer.
+    Dobrar e reduzir pela metade mantém o deslocamento alinhado ao tamanho da página
+    na maioria das trocas (sem registros descartados).
+    """
+    
+    EWMA_ALPHA = 0.3
+    ERROR_WINDOW = 20
+    MAX_ERROR_RATE = 0.2
+    
+    def __init__(self, initial_size: int, min_size: int, max_size: int,
+                 target_seconds: float, max_body_bytes: int):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_seconds = target_seconds
+        self.max_body_bytes = max_body_bytes
+        self.size = self._clamp(initial_size)
+        self.proposed_size = self.size
+        self.growth_deferred = False
+        self.seconds_per_record = None
+        self.bytes_per_record = None
+        self.outcomes = deque(maxlen=self.ERROR_WINDOW)
+        self.history = []  # [[tamanho, páginas]] na ordem em que foram usados
+    
+    def _clamp(self, size: int) -> int:
+        return max(self.min_size, min(self.max_size, size))
+    
+    def _ewma(self, current: Optional[float], sample: float) -> float:
+        return sample if current is None else current + self.EWMA_ALPHA * (sample - current)
+    
+    def size_for_offset(self, offset: int) -> int:
+        """
+        Tamanho da próxima página. Reduções valem de imediato; aumentos esperam até uma
+        página em que o deslocamento fique alinhado ao novo tamanho (no máximo uma)
+        """
+        if self.proposed_size < self.size:
+            self.size = self.proposed_size
+        elif self.proposed_size > self.size:
+            if offset % self.proposed_size == 0 or self.growth_deferred:
+                self.size = self.proposed_size
+                self.growth_deferred = False
+            else:
+                self.growth_deferred = True
+        
+        if self.history and self.history[-1][0] == self.size:
+            self.history[-1][1] += 1
+        else:
+            self.history.append([self.size, 1])
+        return self.size
+    
+    def record_success(self, records: int, elapsed: float, body_bytes: int):
+        """Registra uma página recebida e propõe o próximo tamanho"""
+        self.outcomes.append(False)
+        records = max(records, 1)
+        self.seconds_per_record = self._ewma(self.seconds_per_record, elapsed / records)
+        self.bytes_per_record = self._ewma(self.bytes_per_record, body_bytes / records)
+        
+        expected_seconds = self.seconds_per_record * self.size
+        expected_bytes = self.bytes_per_record * self.size
+        error_rate = sum(self.outcomes) / len(self.outcomes)
+        
+        if expected_seconds > self.target_seconds * 1.25 or expected_bytes > self.max_body_bytes:
+            self.proposed_size = self._clamp(self.size // 2)
+        elif (expected_seconds * 2 <= self.target_seconds and expected_bytes * 2 <= self.max_body_bytes
+              and error_rate <= self.MAX_ERROR_RATE):
+            self.proposed_size = self._clamp(self.size * 2)
+        else:
+            self.proposed_size = self.size
+    
+    def follow_server(self, served_size: int):
+        """
+        Ajusta os limites ao tamanho de página efetivamente usado pelo servidor: um tamanho
+        menor que o pedido vira o máximo (limite do servidor) e um maior vira o mínimo
+        (página mínima ou fixa do servidor)
+        """
+        if served_size < self.size:
+            self.max_size = served_size
+            self.min_size = min(self.min_size, served_size)
+        else:
+            self.min_size = served_size
+            self.max_size = max(self.max_size, served_size)
+        self.size = self._clamp(self.size)
+        self.proposed_size = self._clamp(self.proposed_size)
+        self.growth_deferred = False
+    
+    def record_error(self):
+        """Registra uma requisição com falha (timeout/erro do servidor) e reduz o tamanho"""
+        self.outcomes.append(True)
+        self.proposed_size = self._clamp(self.size // 2)
+        self.growth_deferred = False
+    
+    def describe(self) -> str:
+        """Sequência de tamanhos usados na execução, ex.: 200×2 → 400×10 → 200×1"""
+        return ' → '.join(f"{size}×{pages}" for size, pages in self.history) or '-'
+
+
+class RateLimiter:
+    """Limitador de taxa de requisições: garante um intervalo mínimo entre chamadas"""
+    
+    def __init__(self, min_interval: float):
+        self.min_interval = min_interval
+        self.last_request = 0.0
+    
+    def ready_in(self) -> float:
+        """Segundos até a próxima requisição ser permitida (0 se já estiver liberada)"""
+        return max(0.0, self.last_request + self.min_interval - time.monotonic())
+    
+    def wait(self):
+        """Aguarda o tempo restante do intervalo mínimo desde a última requisição"""
+        delay = self.ready_in()
+        if delay:
+            time.sleep(delay)
+        self.last_request = time.monotonic()
+
+
 class API3CRobot:
-    def __init__(self):
-        """Inicializa o robô com as configurações"""
+    def __init__(self, accounts: Optional[List[Dict]] = None):
+        """
+        Inicializa o robô com as configurações
+        accounts: lista de contas 3C (name, manager_token, base_url, campaign_ids,
+        per_page, min_request_interval). Se omitida, é carregada de ACCOUNTS_FILE
+        ou, na ausência dele, das variáveis MANAGER_TOKEN/BASE_URL/CAMPAIGN_IDS/PER_PAGE.
+        """
         # Configura logging
         log_level = os.getenv('LOG_LEVEL', 'INFO')
         self.logger = LogManager.setup_logging(log_level)
@@ -358,10 +1469,8 @@ class API3CRobot:
         self.logger.info("🚀 Inicializando API 3C Robot...")
         
         # Carrega configurações
-        self.manager_token = os.getenv('MANAGER_TOKEN',"")
         self.cron_schedule = os.getenv('CRON_SCHEDULE')  # Padrão: 02:00 todos os dias
-        self.per_page = int(os.getenv('PER_PAGE',"0"))
-        self.campaign_ids = os.getenv('CAMPAIGN_IDS', '0') # Carrega os IDs das campanhas
+        self.accounts = self._load_accounts(accounts)
         
         self.db_config = {
             'server': os.getenv('DB_SERVER', '192.168.11.200,1434'),
@@ -371,52 +1480,197 @@ class API3CRobot:
             'driver': os.getenv('DB_DRIVER', 'ODBC Driver 17 for SQL Server')
         }
         
-        # Valida configurações obrigatórias
-        if not self.manager_token:
-            self.logger.error("❌ MANAGER_TOKEN não encontrado nas variáveis de ambiente")
-            raise ValueError("MANAGER_TOKEN é obrigatório")
-        
         self.logger.info(f"⚙️ Configurações carregadas:")
         self.logger.info(f"   📅 CRON Schedule: {self.cron_schedule}")
-        self.logger.info(f"   📄 Registros por página: {self.per_page}")
-        self.logger.info(f"   📊 IDs de Campanha: {self.campaign_ids}")
         self.logger.info(f"   🗄️ Database Server: {self.db_config['server']}")
         self.logger.info(f"   📊 Database: {self.db_config['database']}")
         self.logger.info(f"   👤 Username: {self.db_config['username']}")
+        self.logger.info(f"   🏢 Contas configuradas: {len(self.accounts)}")
+        for account in self.accounts:
+            per_page = (f"automático ({account['per_page_min']}-{account['per_page_max']})"
+                        if account['per_page_auto'] else account['per_page'])
+            self.logger.info(f"   🏢 [{account['name']}] Campanhas: {account['campaign_ids']} | "
+                             f"Registros por página: {per_page} | "
+                             f"Intervalo mínimo: {account['min_request_interval']}s")
+            self.logger.info(f"   🔗 [{account['name']}] Base URL: {account['base_url']}")
+        
+        # Sessão HTTP compartilhada entre as contas (criada no primeiro uso) e
+        # limitadores de taxa individuais por conta
+        self.http_session = None
+        self.rate_limiters = {
+            account['name']: RateLimiter(account['min_request_interval']) for account in self.accounts
+        }
         
-        self.base_url = os.getenv('BASE_URL')
-        self.logger.info(f"   🔗 Base URL: {self.base_url}")
+        # Pipeline opcional de download de gravações (criado no primeiro uso)
+        self.recording_downloader = None
+        
+        # Coordenação opcional entre instâncias (criada no primeiro uso)
+        self.lease_manager = None
+        
+        # Ganchos de profiling (desligados, a menos que PROFILE_* esteja definido)
+        self.profiler = RunProfiler.from_env(self.logger)
         
         self.db_manager = DatabaseManager(self.db_config, self.logger)
+        config_done = time.perf_counter()
         
-        # Testa conexão inicial
+        # Testa conexão inicial e lê a versão do schema (uma única ida ao banco).
+        # A conexão permanece aberta e é reutilizada até a primeira execução.
         self.logger.info("🔍 Executando teste inicial de conectividade...")
-        success, error = self.db_manager.test_connection()
+        success, error, schema_version = self.db_manager.connect_and_check_schema()
         if not success:
             self.logger.error(f"❌ Falha no teste de conexão inicial: {error}")
+            self.db_manager.close_connection()
             raise ConnectionError(f"Não foi possível conectar ao banco: {error}")
+        connect_done = time.perf_counter()
         
-        # Cria tabelas
+        # Cria/atualiza tabelas somente se o schema estiver desatualizado
         try:
-            self.db_manager.get_connection()
-            self.db_manager.create_tables()
+            self.db_manager.create_tables(schema_version)
         except Exception as e:
             self.logger.error(f"❌ Erro ao criar tabelas: {e}")
-            raise
-        finally:
             self.db_manager.close_connection()
+            raise
+        schema_done = time.perf_counter()
+        
+        self.startup_timings = {
+            'imports_ms': round((_IMPORTS_DONE - _PROCESS_START) * 1000, 1),
+            'config_ms': round((config_done - _IMPORTS_DONE) * 1000, 1),
+            'db_connect_ms': round((connect_done - config_done) * 1000, 1),
+            'schema_ms': round((schema_done - connect_done) * 1000, 1),
+            'total_ms': round((schema_done - _PROCESS_START) * 1000, 1)
+        }
+        self.logger.info(
+            "⏱️ Tempo de inicialização: "
+            + " | ".join(f"{name}={value}" for name, value in self.startup_timings.items())
+            + f" | frozen={getattr(sys, 'frozen', False)}"
+        )
+    
+    def _load_accounts(self, accounts: Optional[List[Dict]]) -> List[Dict]:
+        """Carrega e normaliza a lista de contas 3C a serem sincronizadas"""
+        if accounts is None:
+            accounts_file = os.getenv('ACCOUNTS_FILE')
+            if accounts_file:
+                self.logger.info(f"📄 Carregando contas do arquivo {accounts_file}")
+                with open(accounts_file, encoding='utf-8') as f:
+                    accounts = json.load(f)
+            else:
+                accounts = [{
+                    'name': 'default',
+                    'manager_token': os.getenv('MANAGER_TOKEN', ""),
+                    'campaign_ids': os.getenv('CAMPAIGN_IDS', '0')  # Carrega os IDs das campanhas
+                }]
+        
+        if not accounts:
+            self.logger.error("❌ Nenhuma conta 3C configurada")
+            raise ValueError("Ao menos uma conta 3C é obrigatória")
+        
+        normalized = []
+        for index, account in enumerate(accounts, start=1):
+            name = str(account.get('name') or f"account_{index}")
+            campaign_ids = account.get('campaign_ids', '0')
+            if isinstance(campaign_ids, (list, tuple)):
+                campaign_ids = ','.join(str(campaign_id) for campaign_id in campaign_ids)
+            
+            # Valida configurações obrigatórias
+            if not account.get('manager_token'):
+                self.logger.error(f"❌ MANAGER_TOKEN não encontrado para a conta {name}")
+                raise ValueError(f"MANAGER_TOKEN é obrigatório (conta {name})")
+            
+            per_page_auto = account.get('per_page_auto', os.getenv('PER_PAGE_AUTO', 'false'))
+            if isinstance(per_page_auto, str):
+                per_page_auto = per_page_auto.lower() == 'true'
+            per_page_min = int(account.get('per_page_min', os.getenv('PER_PAGE_MIN', "100")))
+            per_page_max = int(account.get('per_page_max', os.getenv('PER_PAGE_MAX', "2000")))
+            if per_page_auto and not 1 <= per_page_min <= per_page_max:
+                raise ValueError(f"PER_PAGE_MIN/PER_PAGE_MAX inválidos (conta {name}): {per_page_min}/{per_page_max}")
+            
+            normalized.append({
+                'name': name,
+                'manager_token': account['manager_token'],
+                'base_url': account.get('base_url') or os.getenv('BASE_URL'),
+                'campaign_ids': str(campaign_ids),
+                'per_page': int(account.get('per_page', os.getenv('PER_PAGE', "0"))),
+                'per_page_auto': bool(per_page_auto),
+                'per_page_min': per_page_min,
+                'per_page_max': per_page_max,
+                'min_request_interval': float(account.get('min_request_interval',
+                                                          os.getenv('API_MIN_REQUEST_INTERVAL', "0.5")))
+            })
+        
+        names = [account['name'] for account in normalized]
+        if len(set(names)) != len(names):
+            raise ValueError(f"Nomes de conta duplicados: {names}")
+        
+        return normalized
+    
+    def _get_http_session(self):
+        """Obtém a sessão HTTP compartilhada (reaproveita conexões entre contas)"""
+        if self.http_session is None:
+            import requests
+            self.http_session = requests.Session()
+        return self.http_session
+    
+    def _get_recording_downloader(self) -> Optional['RecordingDownloader']:
+        """Obtém o downloader de gravações (criado no primeiro uso) se RECORDINGS_ENABLED=true"""
+        if os.getenv('RECORDINGS_ENABLED', 'false').lower() != 'true':
+            return None
+        if self.recording_downloader is None:
+            self.recording_downloader = RecordingDownloader(
+                self.db_config,
+                self.logger,
+                os.getenv('RECORDINGS_DIR', 'recordings'),
+                int(os.getenv('RECORDINGS_MAX_WORKERS', '4')),
+                max_attempts=int(os.getenv('RECORDINGS_MAX_ATTEMPTS', '5')),
+                retry_minutes=int(os.getenv('RECORDINGS_RETRY_MINUTES', '15')),
+                backlog_days=int(os.getenv('RECORDINGS_BACKLOG_DAYS', '7')),
+                backlog_limit=int(os.getenv('RECORDINGS_BACKLOG_LIMIT', '1000')),
+                backlog_interval_minutes=int(os.getenv('RECORDINGS_BACKLOG_INTERVAL_MINUTES', '60'))
+            )
+        return self.recording_downloader
+    
+    def _get_lease_manager(self) -> Optional['WorkLeaseManager']:
+        """Obtém o coordenador de leases (criado no primeiro uso) se LEASES_ENABLED=true"""
+        if os.getenv('LEASES_ENABLED', 'false').lower() != 'true':
+            return None
+        if self.lease_manager is None:
+            import socket
+            
+            self.lease_manager = WorkLeaseManager(
+                self.db_config,
+                self.logger,
+                os.getenv('INSTANCE_ID') or f"{socket.gethostname()}:{os.getpid()}",
+                int(os.getenv('LEASE_SECONDS', '300')),
+                int(os.getenv('LEASE_HEARTBEAT_SECONDS', '60')),
+                int(os.getenv('LEASE_MAX_ATTEMPTS', '3')),
+                int(os.getenv('LEASE_RETRY_BACKOFF_SECONDS', '60'))
+            )
+        return self.lease_manager
+    
+    def shutdown(self, interrupted: bool = False):
+        """
+        Aguarda tarefas em segundo plano (downloads de gravações) antes de encerrar
+        interrupted: encerramento por Ctrl+C - descarta os downloads que ainda estão na fila
+        """
+        if self.recording_downloader is not None:
+            self.recording_downloader.close(cancel_pending=interrupted)
+            self.recording_downloader = None
+        if self.lease_manager is not None:
+            self.lease_manager.close()
+            self.lease_manager = None
     
-    def log_execution_start(self, start_date: str, end_date: str, campaign_ids: str) -> int:
-        """Registra início da execução e retorna ID do log"""
-        self.logger.info(f"📊 Registrando início da execução para período {start_date} até {end_date}")
+    def log_execution_start(self, start_date: str, end_date: str, campaign_ids: str,
+                            account_name: Optional[str] = None) -> int:
+        """Registra início da execução (por conta) e retorna ID do log"""
+        self.logger.info(f"📊 Registrando início da execução para período {start_date} até {end_date}"
+                         + (f" (conta {account_name})" if account_name else ""))
         
         cursor = self.db_manager.get_connection().cursor()
         try:
             insert_sql = """
-            INSERT INTO execution_logs (execution_date, start_date, end_date, campaign_ids, status)
-            VALUES (GETDATE(), ?, ?, ?, 'RUNNING')
+            INSERT INTO execution_logs (execution_date, start_date, end_date, campaign_ids, account_name, status)
+            VALUES (GETDATE(), ?, ?, ?, ?, 'RUNNING')
             """
-            cursor.execute(insert_sql, (start_date, end_date, campaign_ids))
+            cursor.execute(insert_sql, (start_date, end_date, campaign_ids, account_name))
             
             # Obtém o ID inserido
             cursor.execute("SELECT @@IDENTITY")
@@ -433,8 +1687,9 @@ class API3CRobot:
             cursor.close()
     
     def log_execution_end(self, log_id: int, total_records: int, successful_records: int, 
-                         failed_records: int, execution_time: int, status: str, error_message: str = None): # type: ignore
-        """Atualiza log de execução com resultados finais"""
+                         failed_records: int, execution_time: int, status: str, error_message: str = None, # type: ignore
+                         inserted_records: int = 0, updated_records: int = 0, unchanged_records: int = 0):
+        """Atualiza log de execução com resultados finais (incluindo novos/alterados/inalterados)"""
         if log_id is None:
             return
             
@@ -445,11 +1700,13 @@ class API3CRobot:
             update_sql = """
             UPDATE execution_logs 
             SET total_records = ?, successful_records = ?, failed_records = ?,
-                execution_time_seconds = ?, status = ?, error_message = ?
+                execution_time_seconds = ?, status = ?, error_message = ?,
+                inserted_records = ?, updated_records = ?, unchanged_records = ?
             WHERE id = ?
             """
             cursor.execute(update_sql, (total_records, successful_records, failed_records,
-                                      execution_time, status, error_message, log_id))
+                                      execution_time, status, error_message,
+                                      inserted_records, updated_records, unchanged_records, log_id))
             
             self.db_manager.connection.commit() # type: ignore
             self.logger.info(f"✅ Log de execução {log_id} atualizado com sucesso")
@@ -459,43 +1716,59 @@ class API3CRobot:
         finally:
             cursor.close()
     
-    def fetch_api_data(self, start_date: str, end_date: str, campaign_ids: str):
+    def fetch_api_data(self, start_date: str, end_date: str, campaign_ids: str, account: Optional[Dict] = None,
+                       fetch_state: Optional[Dict] = None):
         """
         Consulta a API de forma paginada e 'yields' (gera) os dados de cada página.
         Isso evita carregar todos os dados na memória de uma vez.
+        account: conta 3C consultada (padrão: primeira conta configurada)
+        fetch_state: se informado, recebe em 'error' o motivo de uma interrupção
+        antecipada da paginação (None quando a consulta termina normalmente)
         """
-        self.logger.info(f"🌐 Iniciando consulta à API para período {start_date} até {end_date}")
-        self.logger.info(f"📊 Campanhas: {campaign_ids} | Registros por página: {self.per_page}")
+        import requests
+        
+        account = account or self.accounts[0]
+        if account['per_page_auto']:
+            yield from self._fetch_api_data_adaptive(start_date, end_date, campaign_ids, account, fetch_state)
+            return
+        
+        session = self._get_http_session()
+        rate_limiter = self.rate_limiters[account['name']]
+        
+        self.logger.info(f"🌐 [{account['name']}] Iniciando consulta à API para período {start_date} até {end_date}")
+        self.logger.info(f"📊 [{account['name']}] Campanhas: {campaign_ids} | Registros por página: {account['per_page']}")
         
         page = 1
         total_pages = 1
+        fetch_error = None
         
         while page <= total_pages:
             params = {
-                'api_token': self.manager_token,
+                'api_token': account['manager_token'],
                 'page': page,
                 'start_date': start_date,
                 'end_date': end_date,
                 'include': 'campaign_rel',
                 'simple_paginate': 'true',
                 'campaign_ids': campaign_ids,
-                'per_page': self.per_page
+                'per_page': account['per_page']
             }
             
             try:
-                self.logger.info(f"📥 Consultando página {page}/{total_pages}...")
+                self.logger.info(f"📥 [{account['name']}] Consultando página {page}/{total_pages}...")
                 
-                query_string = '&'.join([f"{key}={quote_plus(str(value))}" for key, value in params.items()])
-                full_url = f"{self.base_url}?{query_string}"
-                self.logger.debug(f"🔗 URL da requisição: {full_url.replace(self.manager_token, '***')}")
+                full_url = self._build_api_url(account, params)
+                self.logger.debug(f"🔗 URL da requisição: {full_url.replace(account['manager_token'], '***')}")
 
-                response = requests.get(full_url, timeout=60)
+                rate_limiter.wait()
+                response = session.get(full_url, timeout=60)
                 response.raise_for_status()
                 data = response.json()
                 
                 if data['status'] != 200:
                     error_msg = f"API retornou status {data['status']}: {data.get('detail', 'Erro desconhecido')}"
                     self.logger.error(f"❌ {error_msg}")
+                    fetch_error = error_msg
                     break
                 
                 calls_data = data.get('data', [])
@@ -506,7 +1779,7 @@ class API3CRobot:
                         self.logger.info(f"ℹ️ Página {page} vazia - finalizando consulta")
                     break
                 
-                self.logger.info(f"✅ Página {page} processada: {len(calls_data)} registros")
+                self.logger.info(f"✅ [{account['name']}] Página {page} processada: {len(calls_data)} registros")
                 yield calls_data  # Gera os dados da página atual
                 
                 meta = data.get('meta', {})
@@ -516,306 +1789,1266 @@ class API3CRobot:
                 self.logger.debug(f"📊 Metadados da página: total_pages={total_pages}, current_page={pagination.get('current_page', page)}")
                 
                 page += 1
-                time.sleep(0.5)
                 
             except requests.exceptions.Timeout as e:
                 self.logger.error(f"⏰ Timeout na requisição da página {page}: {e}")
+                fetch_error = f"Timeout na requisição da página {page}: {e}"
                 break
             except requests.exceptions.RequestException as e:
                 self.logger.error(f"🌐 Erro na requisição HTTP da página {page}: {e}")
+                fetch_error = f"Erro na requisição HTTP da página {page}: {e}"
                 break
             except json.JSONDecodeError as e:
                 self.logger.error(f"📄 Erro ao decodificar JSON da página {page}: {e}")
+                fetch_error = f"Erro ao decodificar JSON da página {page}: {e}"
                 break
             except Exception as e:
                 self.logger.error(f"❌ Erro inesperado na página {page}: {e}")
                 self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+                fetch_error = f"Erro inesperado na página {page}: {e}"
                 break
+        
+        if fetch_state is not None:
+            fetch_state['error'] = fetch_error
     
-    def save_call_to_db(self, call_data: Dict) -> Tuple[bool, str]:
+    def _fetch_api_data_adaptive(self, start_date: str, end_date: str, campaign_ids: str, account: Dict,
+                                 fetch_state: Optional[Dict] = None):
         """
-        Salva um registro de chamada no banco de dados
-        Returns: (sucesso: bool, mensagem: str)
+        Paginação com per_page ajustado durante a consulta (PER_PAGE_AUTO / per_page_auto).
+        A posição é controlada pelo deslocamento em registros, não pelo número da página:
+        com tamanho s, pede a página offset // s + 1 e descarta os primeiros offset % s
+        registros (já recebidos), de modo que trocar o tamanho não pula nem repete registros.
+        A paginação completa (simple_paginate=false) informa per_page e total: se o servidor
+        usar um tamanho diferente do pedido (limite próprio, página mínima ou fixa), o início
+        da página é calculado com o tamanho efetivo e o ajuste passa a respeitar esse tamanho;
+        páginas desalinhadas são repetidas até PAGE_MAX_RETRIES vezes. Com total informado,
+        o fim dos dados é o total, e terminar com menos registros é registrado como erro.
+        Timeouts e erros 5xx reduzem a página e repetem a requisição; 429 (limite de taxa)
+        aguarda Retry-After (ou espera exponencial) sem mudar o tamanho (até PAGE_MAX_RETRIES).
+        fetch_state: além de 'error', recebe em 'page_sizes' os tamanhos usados
         """
-        cursor = self.db_manager.get_connection().cursor()
-        call_id = call_data.get('id', 'N/A')
+        import requests
         
-        try:
-            self.logger.debug(f"💾 Salvando chamada ID: {call_id}")
+        session = self._get_http_session()
+        rate_limiter = self.rate_limiters[account['name']]
+        tuner = PageSizeTuner(
+            account['per_page'] or account['per_page_min'],
+            account['per_page_min'],
+            account['per_page_max'],
+            float(os.getenv('PAGE_TARGET_SECONDS', '5')),
+            int(os.getenv('PAGE_MAX_BYTES', str(20 * 1024 * 1024)))
+        )
+        max_retries = int(os.getenv('PAGE_MAX_RETRIES', '3'))
+        
+        self.logger.info(f"🌐 [{account['name']}] Iniciando consulta à API para período {start_date} até {end_date}")
+        self.logger.info(f"📊 [{account['name']}] Campanhas: {campaign_ids} | Registros por página: automático "
+                         f"({tuner.min_size}-{tuner.max_size}, inicial {tuner.size}, alvo {tuner.target_seconds}s)")
+        
+        offset = 0
+        retries = 0
+        rate_limited = 0
+        realigned = 0
+        total = None
+        fetch_error = None
+        
+        while True:
+            size = tuner.size_for_offset(offset)
+            page = offset // size + 1
+            params = {
+                'api_token': account['manager_token'],
+                'page': page,
+                'start_date': start_date,
+                'end_date': end_date,
+                'include': 'campaign_rel',
+                'simple_paginate': 'false',
+                'campaign_ids': campaign_ids,
+                'per_page': size
+            }
             
-            # Dados da rota
-            route = call_data.get('route', {})
+            try:
+                self.logger.info(f"📥 [{account['name']}] Consultando a partir do registro {offset} "
+                                 f"(página {page} com {size} por página)...")
+                
+                full_url = self._build_api_url(account, params)
+                self.logger.debug(f"🔗 URL da requisição: {full_url.replace(account['manager_token'], '***')}")
+                
+                rate_limiter.wait()
+                request_started = time.perf_counter()
+                response = session.get(full_url, timeout=60)
+                response.raise_for_status()
+                body_bytes = len(response.content)
+                data = response.json()
+                elapsed = time.perf_counter() - request_started
+                
+            except requests.exceptions.RequestException as e:
+                error_response = getattr(e, 'response', None)
+                status_code = getattr(error_response, 'status_code', None)
+                if status_code == 429 and rate_limited < max_retries:
+                    # Limite de taxa: espera e repete com o mesmo tamanho (não é erro de página grande)
+                    rate_limited += 1
+                    try:
+                        wait_seconds = float(error_response.headers.get('Retry-After')) # type: ignore
+                    except (TypeError, ValueError):
+                        wait_seconds = min(60, 2 ** rate_limited)
+                    self.logger.warning(f"⏳ [{account['name']}] Limite de taxa da API (429) - aguardando "
+                                        f"{wait_seconds:.0f}s (tentativa {rate_limited}/{max_retries})")
+                    time.sleep(wait_seconds)
+                    continue
+                retryable = (isinstance(e, (requests.exceptions.Timeout, requests.exceptions.ConnectionError))
+                             or (status_code is not None and status_code >= 500))
+                retries += 1
+                if retryable and retries <= max_retries:
+                    tuner.record_error()
+                    self.logger.warning(f"⚠️ [{account['name']}] Falha com {size} por página ({e}) - "
+                                        f"tentativa {retries}/{max_retries} com {tuner.proposed_size} por página")
+                    continue
+                self.logger.error(f"🌐 Erro na requisição HTTP a partir do registro {offset}: {e}")
+                fetch_error = f"Erro na requisição HTTP a partir do registro {offset}: {e}"
+                break
+            except json.JSONDecodeError as e:
+                self.logger.error(f"📄 Erro ao decodificar JSON a partir do registro {offset}: {e}")
+                fetch_error = f"Erro ao decodificar JSON a partir do registro {offset}: {e}"
+                break
+            except Exception as e:
+                self.logger.error(f"❌ Erro inesperado a partir do registro {offset}: {e}")
+                self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+                fetch_error = f"Erro inesperado a partir do registro {offset}: {e}"
+                break
             
-            # Converte call_date para datetime
-            call_date = None
-            if call_data.get('call_date'):
-                try:
-                    call_date = datetime.strptime(call_data['call_date'], '%Y-%m-%d %H:%M:%S')
-                except ValueError:
-                    self.logger.warning(f"⚠️ Formato de data inválido para chamada {call_id}: {call_data.get('call_date')}")
-            
-            # Insert na tabela calls
-            insert_call_sql = """
-            INSERT INTO calls (
-                id, list_name, number, call_date, call_date_rfc3339, campaign_id, campaign,
-                queue_id, queue_name, ring_group_id, ring_group_name, ivr_name, receptive_name, receptive_phone, receptive_did,
-                has_agent, agent, acw_time, speaking_time, ivr_time, ivr_after_call_time, amd_time,
-                waiting_time, speaking_with_agent_time, route_id, route_name, route_host,
-                route_endpoint, route_caller_id, billed_time, billed_value, qualification,
-                behavior, readable_behavior_text, phone_type, recording, recording_amd,
-                status_id, readable_status_text, readable_amd_status_text, mode,
-                hangup_cause, sip_cause, readable_hangup_cause_text, feedback,
-                recorded, ended_by_agent, qualification_note, sid, is_dmc,
-                is_unknown, is_transferred, is_consult, is_transfer, is_conversion,
-                qualification_id, consult_cancelled, recording_transfer, recording_consult,
-                recording_after_consult_cancel, ivr_digit_pressed, record_name, transcription, ai_evaluation_status
-            ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """
+            retries = 0
+            rate_limited = 0
+            if data.get('status') != 200:
+                error_msg = f"API retornou status {data.get('status')}: {data.get('detail', 'Erro desconhecido')}"
+                self.logger.error(f"❌ {error_msg}")
+                fetch_error = error_msg
+                break
             
-            call_values = (
-                call_data.get('id'),
-                call_data.get('list'), # Mapeado para list_name
-                call_data.get('number'),
-                call_date,
-                call_data.get('call_date_rfc3339'),
-                call_data.get('campaign_id'),
-                call_data.get('campaign'),
-                call_data.get('queue_id'),
-                call_data.get('queue_name'),
-                call_data.get('ring_group_id'),
-                call_data.get('ring_group_name'),
-                call_data.get('ivr_name'),
-                call_data.get('receptive_name'),
-                call_data.get('receptive_phone'),
-                call_data.get('receptive_did'),
-                call_data.get('has_agent'),
-                call_data.get('agent'),
-                call_data.get('acw_time'),
-                call_data.get('speaking_time'),
-                call_data.get('ivr_time'),
-                call_data.get('ivr_after_call_time'),
-                call_data.get('amd_time'),
-                call_data.get('waiting_time'),
-                call_data.get('speaking_with_agent_time'),
-                route.get('id') if route else None,
-                route.get('name') if route else None,
-                route.get('host') if route else None,
-                route.get('endpoint') if route else None,
-                route.get('caller_id') if route else None,
-                call_data.get('billed_time'),
-                call_data.get('billed_value'),
-                call_data.get('qualification'),
-                call_data.get('behavior'),
-                call_data.get('readable_behavior_text'),
-                call_data.get('phone_type'),
-                call_data.get('recording'),
-                call_data.get('recording_amd'),
-                call_data.get('status_id'),
-                call_data.get('readable_status_text'),
-                call_data.get('readable_amd_status_text'),
-                call_data.get('mode'),
-                call_data.get('hangup_cause'),
-                call_data.get('sip_cause'),
-                call_data.get('readable_hangup_cause_text'),
-                call_data.get('feedback'),
-                call_data.get('recorded'),
-                call_data.get('ended_by_agent'),
-                call_data.get('qualification_note'),
-                call_data.get('sid'),
-                call_data.get('is_dmc'),
-                call_data.get('is_unknown'),
-                call_data.get('is_transferred'),
-                call_data.get('is_consult'),
-                call_data.get('is_transfer'),
-                call_data.get('is_conversion'),
-                call_data.get('qualification_id'),
-                call_data.get('consult_cancelled'),
-                call_data.get('recording_transfer'),
-                call_data.get('recording_consult'),
-                call_data.get('recording_after_consult_cancel'),
-                call_data.get('ivr_digit_pressed'),
-                call_data.get('record_name'),
-                call_data.get('transcription'),
-                call_data.get('ai_evaluation_status')
-            )
+            page_records = data.get('data', [])
+            pagination = data.get('meta', {}).get('pagination', {})
+            if pagination.get('total') is not None:
+                total = int(pagination['total'])
+            served_size = int(pagination.get('per_page') or size)
+            tuner.record_success(len(page_records), elapsed, body_bytes)
             
-            cursor.execute(insert_call_sql, call_values)
+            page_start = (page - 1) * served_size
+            if served_size == size and page_records and (
+                    len(page_records) > size
+                    or (total is not None and page_start + len(page_records) < total and len(page_records) < size)):
+                # Página maior que o pedido, ou curta antes do total, sem per_page informado: tamanho do
+                # servidor não declarado. Só a primeira página tem início conhecido (registro 0)
+                served_size = len(page_records)
+                page_start = 0 if page == 1 else None
             
-            # Salva dados de mailing se existirem
-            mailing_data = call_data.get('mailing_data')
-            if mailing_data:
-                self.logger.debug(f"📧 Salvando dados de mailing para chamada {call_id}")
-                
-                insert_mailing_sql = """
-                INSERT INTO mailing_data (
-                    _id, call_id, identifier, campaign_id, company_id, list_id,
-                    uf, phone, dialed_phone, dialed_identifier, on_calling,
-                    column_position, row_position, estrategia, razao_social, nome_fantasia,
-                    valor_conta, cidade, cep, uf_mailing, socio
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """
-                
-                data_fields = mailing_data.get('data', {})
-                mailing_values = (
-                    mailing_data.get('_id'),
-                    call_data.get('id'),
-                    mailing_data.get('identifier'),
-                    mailing_data.get('campaign_id'),
-                    mailing_data.get('company_id'),
-                    mailing_data.get('list_id'),
-                    mailing_data.get('uf'),
-                    mailing_data.get('phone'),
-                    mailing_data.get('dialed_phone'),
-                    mailing_data.get('dialed_identifier'),
-                    mailing_data.get('on_calling'),
-                    mailing_data.get('column_position'),
-                    mailing_data.get('row_position'),
-                    data_fields.get('ESTRATEGIA'),
-                    data_fields.get('RAZAO SOCIAL'),
-                    data_fields.get('NOME FANTASIA'),
-                    data_fields.get('VALOR CONTA'),
-                    data_fields.get('CIDADE'),
-                    data_fields.get('CEP'),
-                    data_fields.get('UF'),
-                    data_fields.get('SOCIO')
-                )
-                
-                cursor.execute(insert_mailing_sql, mailing_values)
+            if served_size != size:
+                tuner.follow_server(served_size)
+                self.logger.warning(f"⚠️ [{account['name']}] API retornou {served_size} registros por página "
+                                    f"(pedidos {size}) - usando de {tuner.min_size} a {tuner.max_size} por página")
+                if page_start is None or not page_start <= offset < page_start + len(page_records):
+                    # A página recebida não contém o deslocamento atual: repete com o tamanho efetivo
+                    realigned += 1
+                    if realigned > max_retries:
+                        fetch_error = (f"Páginas da API desalinhadas do registro {offset} após "
+                                       f"{max_retries} tentativas (per_page {size}, servidor {served_size})")
+                        self.logger.error(f"❌ [{account['name']}] {fetch_error}")
+                        break
+                    continue
+            realigned = 0
             
-            self.db_manager.connection.commit() # type: ignore
-            self.logger.debug(f"✅ Chamada {call_id} salva com sucesso")
-            return True, f"Chamada {call_id} salva com sucesso"
-            
-        except pyodbc.IntegrityError as e:
-            if "PRIMARY KEY constraint" in str(e):
-                msg = f"Registro já existe: {call_id}"
-                self.logger.debug(f"ℹ️ {msg}")
-                return True, msg  # Considera como sucesso pois o dado já existe
-            else:
-                msg = f"Erro de integridade ao salvar chamada {call_id}: {e}"
-                self.logger.error(f"❌ {msg}")
-                return False, msg
+            calls_data = page_records[offset - page_start:]
+            if not calls_data:
+                if offset == 0:
+                    self.logger.warning("⚠️ Nenhum dado encontrado na primeira página")
+                else:
+                    self.logger.info(f"ℹ️ Nenhum registro após o registro {offset} - finalizando consulta")
+                break
+            
+            self.logger.info(f"✅ [{account['name']}] Página processada: {len(calls_data)} registros em {elapsed:.2f}s "
+                             f"({body_bytes / 1024:.0f} KiB)")
+            yield calls_data
+            offset += len(calls_data)
+            
+            # Fim dos dados: o total informado pela API ou, sem ele, uma página incompleta/a última página
+            if total is not None:
+                if offset >= total:
+                    break
+                continue
+            total_pages = pagination.get('total_pages')
+            if len(page_records) < served_size or (total_pages is not None and page >= total_pages):
+                break
+        
+        if fetch_error is None and total is not None and offset < total:
+            fetch_error = f"Consulta terminou com {offset} de {total} registros informados pela API"
+            self.logger.error(f"❌ [{account['name']}] {fetch_error}")
+        
+        self.logger.info(f"📐 [{account['name']}] Tamanhos de página usados (registros×páginas): {tuner.describe()}")
+        if fetch_state is not None:
+            fetch_state['error'] = fetch_error
+            fetch_state['page_sizes'] = tuner.describe()
+    
+    def _build_api_url(self, account: Dict, params: Dict) -> str:
+        """Monta a URL da API da conta com os parâmetros codificados"""
+        query_string = '&'.join([f"{key}={quote_plus(str(value))}" for key, value in params.items()])
+        return f"{account['base_url']}?{query_string}"
+    
+    def fetch_api_count(self, start_date: str, end_date: str, campaign_ids: str,
+                        account: Optional[Dict] = None) -> Optional[int]:
+        """
+        Consulta apenas o total de registros de uma janela na API (uma página de
+        1 registro, com paginação completa para obter os metadados de total)
+        Returns: total informado pela API ou None se não foi possível obtê-lo
+        """
+        import requests
+        
+        account = account or self.accounts[0]
+        params = {
+            'api_token': account['manager_token'],
+            'page': 1,
+            'start_date': start_date,
+            'end_date': end_date,
+            'simple_paginate': 'false',
+            'campaign_ids': campaign_ids,
+            'per_page': 1
+        }
+        
+        try:
+            self.rate_limiters[account['name']].wait()
+            response = self._get_http_session().get(self._build_api_url(account, params), timeout=60)
+            response.raise_for_status()
+            data = response.json()
+            
+            if data['status'] != 200:
+                self.logger.error(f"❌ [{account['name']}] API retornou status {data['status']} na contagem: "
+                                  f"{data.get('detail', 'Erro desconhecido')}")
+                return None
+            
+            total = data.get('meta', {}).get('pagination', {}).get('total')
+            if total is None:
+                self.logger.warning(f"⚠️ [{account['name']}] API não informou o total de registros para {start_date} até {end_date}")
+                return None
+            return int(total)
+            
+        except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+            self.logger.error(f"❌ [{account['name']}] Erro ao consultar contagem da API ({start_date} até {end_date}): {e}")
+            return None
+    
+    def build_call_values(self, call_data: Dict) -> Tuple:
+        """Transforma um registro da API na tupla de valores da tabela calls (ordem de CALL_COLUMNS)"""
+        # Dados da rota
+        route = call_data.get('route', {})
+        
+        # Converte call_date para datetime
+        call_date = None
+        if call_data.get('call_date'):
+            try:
+                call_date = datetime.strptime(call_data['call_date'], '%Y-%m-%d %H:%M:%S')
+            except ValueError:
+                self.logger.warning(f"⚠️ Formato de data inválido para chamada {call_data.get('id', 'N/A')}: {call_data.get('call_date')}")
+        
+        return (
+            call_data.get('id'),
+            call_data.get('list'), # Mapeado para list_name
+            call_data.get('number'),
+            call_date,
+            call_data.get('call_date_rfc3339'),
+            call_data.get('campaign_id'),
+            call_data.get('campaign'),
+            call_data.get('queue_id'),
+            call_data.get('queue_name'),
+            call_data.get('ring_group_id'),
+            call_data.get('ring_group_name'),
+            call_data.get('ivr_name'),
+            call_data.get('receptive_name'),
+            call_data.get('receptive_phone'),
+            call_data.get('receptive_did'),
+            call_data.get('has_agent'),
+            call_data.get('agent'),
+            call_data.get('acw_time'),
+            call_data.get('speaking_time'),
+            call_data.get('ivr_time'),
+            call_data.get('ivr_after_call_time'),
+            call_data.get('amd_time'),
+            call_data.get('waiting_time'),
+            call_data.get('speaking_with_agent_time'),
+            route.get('id') if route else None,
+            route.get('name') if route else None,
+            route.get('host') if route else None,
+            route.get('endpoint') if route else None,
+            route.get('caller_id') if route else None,
+            call_data.get('billed_time'),
+            call_data.get('billed_value'),
+            call_data.get('qualification'),
+            call_data.get('behavior'),
+            call_data.get('readable_behavior_text'),
+            call_data.get('phone_type'),
+            call_data.get('recording'),
+            call_data.get('recording_amd'),
+            call_data.get('status_id'),
+            call_data.get('readable_status_text'),
+            call_data.get('readable_amd_status_text'),
+            call_data.get('mode'),
+            call_data.get('hangup_cause'),
+            call_data.get('sip_cause'),
+            call_data.get('readable_hangup_cause_text'),
+            call_data.get('feedback'),
+            call_data.get('recorded'),
+            call_data.get('ended_by_agent'),
+            call_data.get('qualification_note'),
+            call_data.get('sid'),
+            call_data.get('is_dmc'),
+            call_data.get('is_unknown'),
+            call_data.get('is_transferred'),
+            call_data.get('is_consult'),
+            call_data.get('is_transfer'),
+            call_data.get('is_conversion'),
+            call_data.get('qualification_id'),
+            call_data.get('consult_cancelled'),
+            call_data.get('recording_transfer'),
+            call_data.get('recording_consult'),
+            call_data.get('recording_after_consult_cancel'),
+            call_data.get('ivr_digit_pressed'),
+            call_data.get('record_name'),
+            call_data.get('transcription'),
+            call_data.get('ai_evaluation_status')
+        )
+    
+    @staticmethod
+    def build_mailing_values(call_data: Dict) -> Optional[Tuple]:
+        """Transforma os dados de mailing de um registro na tupla da tabela mailing_data (ou None)"""
+        mailing_data = call_data.get('mailing_data')
+        if not mailing_data:
+            return None
+        
+        data_fields = mailing_data.get('data', {})
+        return (
+            mailing_data.get('_id'),
+            call_data.get('id'),
+            mailing_data.get('identifier'),
+            mailing_data.get('campaign_id'),
+            mailing_data.get('company_id'),
+            mailing_data.get('list_id'),
+            mailing_data.get('uf'),
+            mailing_data.get('phone'),
+            mailing_data.get('dialed_phone'),
+            mailing_data.get('dialed_identifier'),
+            mailing_data.get('on_calling'),
+            mailing_data.get('column_position'),
+            mailing_data.get('row_position'),
+            data_fields.get('ESTRATEGIA'),
+            data_fields.get('RAZAO SOCIAL'),
+            data_fields.get('NOME FANTASIA'),
+            data_fields.get('VALOR CONTA'),
+            data_fields.get('CIDADE'),
+            data_fields.get('CEP'),
+            data_fields.get('UF'),
+            data_fields.get('SOCIO')
+        )
+    
+    @staticmethod
+    def compute_row_hash(call_values: Tuple, mailing_values: Optional[Tuple]) -> str:
+        """Hash do conteúdo de um registro (chamada + mailing) usado para detectar alterações"""
+        payload = json.dumps([call_values, mailing_values], default=str, ensure_ascii=False, separators=(',', ':'))
+        return hashlib.blake2b(payload.encode('utf-8'), digest_size=16).hexdigest()
+    
+    def transform_page(self, page_data: List[Dict]) -> List[Dict]:
+        """
+        Etapa de transformação: converte os registros de uma página nas tuplas de
+        escrita e calcula o hash de conteúdo de cada um (duplicatas na página: vale o último)
+        """
+        rows = {}
+        for call_data in page_data:
+            call_values = self.build_call_values(call_data)
+            mailing_values = self.build_mailing_values(call_data)
+            rows[call_values[0]] = {
+                'id': call_values[0],
+                'call_values': call_values,
+                'mailing_values': mailing_values,
+                'row_hash': self.compute_row_hash(call_values, mailing_values)
+            }
+        return list(rows.values())
+    
+    def fetch_stored_hashes(self, cursor, call_ids: List[str]) -> Dict[str, Optional[str]]:
+        """Lê em lote os hashes gravados para os IDs informados (ausentes = registros novos)"""
+        stored = {}
+        for chunk_start in range(0, len(call_ids), HASH_LOOKUP_CHUNK_SIZE):
+            chunk = call_ids[chunk_start:chunk_start + HASH_LOOKUP_CHUNK_SIZE]
+            placeholders = ', '.join('?' for _ in chunk)
+            cursor.execute(f"SELECT id, row_hash FROM calls WHERE id IN ({placeholders})", chunk)
+            stored.update({row[0]: row[1] for row in cursor.fetchall()})
+        return stored
+    
+    def _write_rows(self, cursor, new_rows: List[Dict], changed_rows: List[Dict]):
+        """Executa (sem commit) os inserts dos registros novos e os updates dos alterados"""
+        if new_rows:
+            cursor.executemany(INSERT_CALL_SQL, [row['call_values'] + (row['row_hash'],) for row in new_rows])
+        
+        if changed_rows:
+            cursor.executemany(UPDATE_CALL_SQL, [
+                row['call_values'][1:] + (row['row_hash'], row['id']) for row in changed_rows
+            ])
+            # O mailing dos registros alterados é substituído
+            cursor.executemany("DELETE FROM mailing_data WHERE call_id = ?", [(row['id'],) for row in changed_rows])
+        
+        mailing_rows = [row['mailing_values'] for row in new_rows + changed_rows if row['mailing_values']]
+        if mailing_rows:
+            cursor.executemany(INSERT_MAILING_SQL, mailing_rows)
+    
+    def _write_isolating(self, connection, cursor, new_rows: List[Dict], changed_rows: List[Dict],
+                         result: Dict, written_rows: List[Dict]):
+        """
+        Grava o lote em uma transação. Se falhar, desfaz e divide o lote ao meio
+        recursivamente: as metades válidas continuam sendo gravadas em lote e os
+        registros inválidos são isolados em cerca de log2(n) idas ao banco cada.
+        Um registro novo que viola a chave primária foi inserido por outro gravador depois
+        da consulta de hashes (lease assumido, execuções sobrepostas): conta como
+        inalterado se o hash gravado for igual, senão é gravado como alteração.
+        """
+        try:
+            self._write_rows(cursor, new_rows, changed_rows)
+            connection.commit()
         except Exception as e:
-            msg = f"Erro inesperado ao salvar chamada {call_id}: {e}"
-            self.logger.error(f"❌ {msg}")
-            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
-            self.db_manager.connection.rollback() # type: ignore
-            return False, msg
+            connection.rollback()
+            batch = [(row, True) for row in new_rows] + [(row, False) for row in changed_rows]
+            
+            if len(batch) == 1:
+                row, is_new = batch[0]
+                call_id = row['id']
+                if is_new and "PRIMARY KEY constraint" in str(e):
+                    self.logger.debug(f"ℹ️ Registro já existe (gravado por outra execução): {call_id}")
+                    if self.fetch_stored_hashes(cursor, [call_id]).get(call_id) == row['row_hash']:
+                        result['unchanged'] += 1
+                    else:
+                        self._write_isolating(connection, cursor, [], [row], result, written_rows)
+                    return
+                
+                result['failed'] += 1
+                result['errors'].append((call_id, str(e)))
+                self.logger.error(f"❌ Erro ao salvar chamada {call_id}: {e}")
+                return
+            
+            self.logger.debug(f"🔀 Falha no lote de {len(batch)} registros - dividindo para isolar o erro")
+            middle = len(batch) // 2
+            for half in (batch[:middle], batch[middle:]):
+                self._write_isolating(connection, cursor,
+                                      [row for row, is_new in half if is_new],
+                                      [row for row, is_new in half if not is_new],
+                                      result, written_rows)
+            return
+        
+        result['inserted'] += len(new_rows)
+        result['updated'] += len(changed_rows)
+        written_rows.extend(new_rows + changed_rows)
+    
+    def save_page_to_db(self, page_data: List[Dict], touched_windows: Optional[set] = None,
+                        written_calls: Optional[List[Dict]] = None) -> Dict:
+        """
+        Salva uma página de registros: transforma, compara em lote os hashes com os
+        gravados e escreve apenas os registros novos ou alterados, com um commit por página
+        touched_windows: se informado, recebe os pares (dia, campanha) dos registros gravados
+        written_calls: se informado, recebe os registros transformados efetivamente gravados
+        Returns: dict com inserted/updated/unchanged/failed e errors [(call_id, erro)]
+        """
+        result = {'inserted': 0, 'updated': 0, 'unchanged': 0, 'failed': 0, 'errors': []}
+        with self.profiler.stage('transform'):
+            rows = self.transform_page(page_data)
+        if not rows:
+            return result
+        
+        connection = self.db_manager.get_connection()
+        cursor = connection.cursor()
+        cursor.fast_executemany = True
+        try:
+            with self.profiler.stage('hash_lookup'):
+                stored_hashes = self.fetch_stored_hashes(cursor, [row['id'] for row in rows])
+            new_rows = [row for row in rows if row['id'] not in stored_hashes]
+            changed_rows = [row for row in rows
+                            if row['id'] in stored_hashes and stored_hashes[row['id']] != row['row_hash']]
+            # Repetições do mesmo ID na página também contam como inalteradas
+            result['unchanged'] = len(page_data) - len(new_rows) - len(changed_rows)
+            
+            written_rows = []
+            with self.profiler.stage('write'):
+                self._write_isolating(connection, cursor, new_rows, changed_rows, result, written_rows)
+            
+            if written_calls is not None:
+                written_calls.extend(written_rows)
+            if touched_windows is not None:
+                touched_windows.update(
+                    (row['call_values'][3].date(), row['call_values'][5])
+                    for row in written_rows
+                    if row['call_values'][3] is not None and row['call_values'][5] is not None
+                )
         finally:
             cursor.close()
+        
+        return result
     
-    def process_data(self, start_date: str, end_date: str, campaign_ids: str) -> Dict[str, int]:
+    def process_data(self, start_date: str, end_date: str, campaign_ids: Optional[str] = None,
+                     accounts: Optional[List[Dict]] = None) -> Dict[str, int]:
         """
         Processo principal: consulta API e salva no banco
-        Returns: dict com estatísticas da execução
+        Com várias contas, as páginas são intercaladas (round-robin) para que uma
+        conta grande não atrase as pequenas. A cada passo é atendida a próxima conta
+        cujo limite de taxa já permite uma requisição; o loop só dorme quando nenhuma
+        está liberada, até a mais próxima ficar. Cada conta tem seu próprio registro
+        em execution_logs.
+        campaign_ids: sobrescreve as campanhas de todas as contas (padrão: as de cada conta)
+        Returns: dict com estatísticas (somadas entre as contas) da execução
         """
         start_time = time.time()
-        stats = {
-            'total_records': 0,
-            'successful_records': 0,
-            'failed_records': 0,
-            'execution_time': 0
-        }
+        accounts = accounts or self.accounts
         
-        # Registra início da execução
-        log_id = self.log_execution_start(start_date, end_date, campaign_ids)
+        # Registra início da execução de cada conta
+        runs = []
+        for account in accounts:
+            account_campaigns = campaign_ids or account['campaign_ids']
+            fetch_state = {}
+            runs.append({
+                'account': account,
+                'campaign_ids': account_campaigns,
+                'log_id': self.log_execution_start(start_date, end_date, account_campaigns, account['name']),
+                'pages': self.fetch_api_data(start_date, end_date, account_campaigns, account, fetch_state),
+                'fetch_state': fetch_state,
+                'finished': False,
+                'status': None,
+                'stats': {
+                    'total_records': 0,
+                    'successful_records': 0,
+                    'failed_records': 0,
+                    'inserted_records': 0,
+                    'updated_records': 0,
+                    'unchanged_records': 0,
+                    'execution_time': 0,
+                    'failed_calls': []
+                }
+            })
+        
+        # Pares (dia, campanha) gravados nesta execução, para atualizar os agregados
+        touched_windows = set()
+        recording_downloader = self._get_recording_downloader()
+        self.profiler.start([run['log_id'] for run in runs])
+        page_number = 0
         
         try:
             self.logger.info("🚀 Iniciando processo de coleta e sincronização de dados...")
             self.logger.info(f"📅 Período: {start_date} até {end_date}")
-            self.logger.info(f"📊 Campanhas: {campaign_ids}")
+            self.logger.info(f"🏢 Contas: {', '.join(run['account']['name'] for run in runs)}")
             
             # Conecta ao banco
             self.db_manager.get_connection()
             
-            # Busca e processa dados da API página por página
+            # Gravações de execuções anteriores que falharam ou ficaram incompletas
+            # (buscadas em segundo plano, com a conexão do downloader)
+            if recording_downloader:
+                recording_downloader.resume_partials(self.accounts)
+                for run in runs:
+                    recording_downloader.sweep_backlog(run['account'], run['campaign_ids'])
+            
+            # Busca e processa dados da API página por página, uma página de cada conta por vez
             self.logger.info("🌐 Iniciando consulta e salvamento de dados da API...")
             
-            total_processed = 0
-            for page_data in self.fetch_api_data(start_date, end_date, campaign_ids):
-                stats['total_records'] += len(page_data)
+            active_runs = list(runs)
+            while active_runs:
+                # Próxima conta liberada pelo seu limite de taxa, na ordem do round-robin;
+                # uma conta com intervalo longo não segura as demais
+                delays = [self.rate_limiters[run['account']['name']].ready_in() for run in active_runs]
+                if min(delays) > 0:
+                    with self.profiler.stage('fetch'):
+                        time.sleep(min(delays))
+                    continue
+                run = active_runs.pop(delays.index(0))
                 
-                if not page_data:
+                try:
+                    with self.profiler.stage('fetch'):
+                        page_data = next(run['pages'])
+                except StopIteration:
+                    self._finish_account_run(run, start_time)
                     continue
-
-                self.logger.info(f"💾 Salvando lote de {len(page_data)} registros...")
-                for call_data in page_data:
-                    total_processed += 1
-                    try:
-                        success, message = self.save_call_to_db(call_data)
-                        if success:
-                            stats['successful_records'] += 1
-                        else:
-                            stats['failed_records'] += 1
-                            self.logger.error(f"❌ Falha no registro {total_processed}: {message}")
-                    except Exception as e:
-                        stats['failed_records'] += 1
-                        self.logger.error(f"❌ Erro crítico ao processar registro {total_processed}: {e}")
-                        self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
-
-                self.logger.info(f"📊 Progresso: {stats['successful_records']}/{stats['total_records']} salvos com sucesso.")
-
-            if stats['total_records'] == 0:
-                self.logger.warning("⚠️ Nenhum dado retornado pela API para o período.")
-                self.log_execution_end(log_id, 0, 0, 0, int(time.time() - start_time), 'COMPLETED_NO_DATA')
-                return stats
-            
-            # Estatísticas finais
-            stats['execution_time'] = int(time.time() - start_time)
-            
-            self.logger.info("="*80)
-            self.logger.info("📋 RELATÓRIO FINAL DE EXECUÇÃO")
-            self.logger.info("="*80)
-            self.logger.info(f"🎯 Total de registros processados: {stats['total_records']}")
-            self.logger.info(f"✅ Registros salvos com sucesso: {stats['successful_records']}")
-            self.logger.info(f"❌ Registros com falha: {stats['failed_records']}")
-            self.logger.info(f"📊 Taxa de sucesso: {(stats['successful_records']/stats['total_records']*100):.1f}%")
-            self.logger.info(f"⏱️ Tempo total de execução: {stats['execution_time']} segundos")
-            self.logger.info("="*80)
-            
-            # Registra conclusão da execução
-            status = 'COMPLETED_SUCCESS' if stats['failed_records'] == 0 else 'COMPLETED_WITH_ERRORS'
-            self.log_execution_end(log_id, stats['total_records'], stats['successful_records'], 
-                                 stats['failed_records'], stats['execution_time'], status)
+                active_runs.append(run)
+                
+                written_calls = [] if recording_downloader else None
+                self._save_page(page_data, run['stats'], run['account']['name'], touched_windows, written_calls)
+                
+                # Gravações são baixadas em segundo plano, sem bloquear a sincronização
+                if written_calls:
+                    recording_downloader.submit_calls(written_calls, run['account'])
+                
+                page_number += 1
+                self.profiler.page_boundary(f"página {page_number} ({run['account']['name']})")
             
         except Exception as e:
-            stats['execution_time'] = int(time.time() - start_time)
             error_msg = f"Erro crítico no processo principal: {e}"
             self.logger.error(f"💥 {error_msg}")
             self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
             
-            # Registra erro na execução
-            self.log_execution_end(log_id, stats['total_records'], stats['successful_records'],
-                                 stats['failed_records'], stats['execution_time'], 'FAILED', error_msg)
+            # Registra erro nas execuções ainda em andamento
+            for run in runs:
+                if not run['finished']:
+                    self._finish_account_run(run, start_time, error_msg)
             
         finally:
+            if touched_windows:
+                with self.profiler.stage('rollups'):
+                    self.refresh_rollups(touched_windows)
+            self.profiler.stop()
             self.db_manager.close_connection()
+        
+        stats = {
+            key: sum(run['stats'][key] for run in runs)
+            for key in ('total_records', 'successful_records', 'failed_records',
+                        'inserted_records', 'updated_records', 'unchanged_records')
+        }
+        stats['execution_time'] = int(time.time() - start_time)
+        stats['incomplete_runs'] = sum(1 for run in runs if run['status'] in ('FAILED', 'INCOMPLETE'))
+        
+        if len(runs) > 1:
+            self.logger.info(f"🏢 Total consolidado de {len(runs)} contas: {stats['successful_records']}/"
+                             f"{stats['total_records']} salvos, {stats['failed_records']} falhas "
+                             f"em {stats['execution_time']} segundos")
             
         return stats
     
+    def _save_page(self, page_data: List[Dict], stats: Dict[str, int], account_name: str,
+                   touched_windows: Optional[set] = None, written_calls: Optional[List[Dict]] = None):
+        """Salva os registros de uma página e atualiza as estatísticas da conta"""
+        stats['total_records'] += len(page_data)
+        
+        if not page_data:
+            return
+        
+        self.logger.info(f"💾 [{account_name}] Salvando lote de {len(page_data)} registros...")
+        try:
+            result = self.save_page_to_db(page_data, touched_windows, written_calls)
+        except Exception as e:
+            stats['failed_records'] += len(page_data)
+            self.logger.error(f"❌ [{account_name}] Erro crítico ao processar lote: {e}")
+            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+            self.db_manager.connection.rollback() # type: ignore
+            return
+        
+        stats['inserted_records'] += result['inserted']
+        stats['updated_records'] += result['updated']
+        stats['unchanged_records'] += result['unchanged']
+        stats['successful_records'] += result['inserted'] + result['updated'] + result['unchanged']
+        stats['failed_records'] += result['failed']
+        stats['failed_calls'].extend(result['errors'])
+        
+        self.logger.info(f"📊 [{account_name}] Progresso: {stats['successful_records']}/{stats['total_records']} salvos com sucesso "
+                         f"(novos: {stats['inserted_records']}, alterados: {stats['updated_records']}, "
+                         f"inalterados: {stats['unchanged_records']}).")
+    
+    def _finish_account_run(self, run: Dict, start_time: float, error_msg: Optional[str] = None):
+        """Gera o relatório final de uma conta e atualiza seu registro em execution_logs"""
+        run['finished'] = True
+        stats = run['stats']
+        account_name = run['account']['name']
+        stats['execution_time'] = int(time.time() - start_time)
+        change_counts = {key: stats[key] for key in ('inserted_records', 'updated_records', 'unchanged_records')}
+        
+        if error_msg:
+            run['status'] = 'FAILED'
+            self.log_execution_end(run['log_id'], stats['total_records'], stats['successful_records'],
+                                   stats['failed_records'], stats['execution_time'], 'FAILED', error_msg,
+                                   **change_counts)
+            return
+        
+        # Paginação interrompida por erro: os dados do período estão incompletos
+        fetch_error = run['fetch_state'].get('error')
+        if fetch_error:
+            self.logger.error(f"⚠️ [{account_name}] Consulta à API interrompida antes do fim: {fetch_error}")
+            self.logger.info(f"📊 [{account_name}] Parcial: {stats['successful_records']}/{stats['total_records']} salvos")
+            run['status'] = 'INCOMPLETE'
+            self.log_execution_end(run['log_id'], stats['total_records'], stats['successful_records'],
+                                   stats['failed_records'], stats['execution_time'], 'INCOMPLETE',
+                                   f"Consulta à API interrompida: {fetch_error}", **change_counts)
+            return
+        
+        if stats['total_records'] == 0:
+            self.logger.warning(f"⚠️ [{account_name}] Nenhum dado retornado pela API para o período.")
+            run['status'] = 'COMPLETED_NO_DATA'
+            self.log_execution_end(run['log_id'], 0, 0, 0, stats['execution_time'], 'COMPLETED_NO_DATA')
+            return
+        
+        self.logger.info("="*80)
+        self.logger.info(f"📋 RELATÓRIO FINAL DE EXECUÇÃO - CONTA {account_name}")
+        self.logger.info("="*80)
+        self.logger.info(f"🎯 Total de registros processados: {stats['total_records']}")
+        self.logger.info(f"✅ Registros salvos com sucesso: {stats['successful_records']}")
+        self.logger.info(f"❌ Registros com falha: {stats['failed_records']}")
+        self.logger.info(f"🆕 Novos: {stats['inserted_records']} | ✏️ Alterados: {stats['updated_records']} | "
+                         f"⏸️ Inalterados: {stats['unchanged_records']}")
+        self.logger.info(f"📊 Taxa de sucesso: {(stats['successful_records']/stats['total_records']*100):.1f}%")
+        self.logger.info(f"⏱️ Tempo total de execução: {stats['execution_time']} segundos")
+        if run['fetch_state'].get('page_sizes'):
+            self.logger.info(f"📐 Tamanhos de página usados (registros×páginas): {run['fetch_state']['page_sizes']}")
+        self.logger.info("="*80)
+        
+        # Registra conclusão da execução (com os IDs das chamadas que falharam)
+        status = 'COMPLETED_SUCCESS' if stats['failed_records'] == 0 else 'COMPLETED_WITH_ERRORS'
+        run['status'] = status
+        error_message = None
+        if stats['failed_calls']:
+            shown = stats['failed_calls'][:FAILED_CALLS_IN_LOG]
+            error_message = "Chamadas com falha: " + "; ".join(f"{call_id}: {error}" for call_id, error in shown)
+            if len(stats['failed_calls']) > len(shown):
+                error_message += f" (e mais {len(stats['failed_calls']) - len(shown)})"
+        self.log_execution_end(run['log_id'], stats['total_records'], stats['successful_records'],
+                               stats['failed_records'], stats['execution_time'], status, error_message,
+                               **change_counts)
+    
+    def refresh_rollup_day(self, cursor, day, campaign_ids: Optional[List[int]] = None):
+        """
+        Recalcula (sem commit) os agregados de um dia em calls_daily_rollup,
+        apenas para as campanhas informadas (ou para todas, se None)
+        """
+        day_start = datetime.combine(day, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+        
+        if campaign_ids:
+            placeholders = ', '.join('?' for _ in campaign_ids)
+            campaign_filter = f" AND campaign_id IN ({placeholders})"
+            cursor.execute(f"DELETE FROM calls_daily_rollup WHERE rollup_date = ?{campaign_filter}",
+                           (day_start.date(), *campaign_ids))
+            cursor.execute(INSERT_ROLLUP_SQL.format(campaign_filter=campaign_filter),
+                           (day_start, day_end, *campaign_ids))
+        else:
+            cursor.execute("DELETE FROM calls_daily_rollup WHERE rollup_date = ?", (day_start.date(),))
+            cursor.execute(INSERT_ROLLUP_SQL.format(campaign_filter=""), (day_start, day_end))
+    
+    def refresh_rollups(self, touched_windows: set):
+        """
+        Atualiza incrementalmente os agregados diários somente para os pares
+        (dia, campanha) gravados na execução, com um commit por dia
+        """
+        if os.getenv('ROLLUPS_ENABLED', 'true').lower() != 'true':
+            return
+        
+        campaigns_by_day = {}
+        for day, campaign_id in touched_windows:
+            campaigns_by_day.setdefault(day, set()).add(int(campaign_id))
+        
+        self.logger.info(f"📈 Atualizando agregados diários de {len(campaigns_by_day)} dia(s)...")
+        connection = self.db_manager.get_connection()
+        cursor = connection.cursor()
+        try:
+            for day in sorted(campaigns_by_day):
+                self.refresh_rollup_day(cursor, day, sorted(campaigns_by_day[day]))
+                connection.commit()
+            self.logger.info("✅ Agregados diários atualizados")
+        except Exception as e:
+            connection.rollback()
+            self.logger.error(f"❌ Erro ao atualizar agregados diários: {e}")
+            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+        finally:
+            cursor.close()
+    
+    def rebuild_rollups(self, start_date: Optional[str] = None, end_date: Optional[str] = None) -> int:
+        """
+        Reconstrói os agregados diários de todo o histórico (ou do período informado),
+        dia a dia, a partir de calls
+        Returns: quantidade de dias reconstruídos
+        """
+        self.logger.info("="*80)
+        self.logger.info("📈 RECONSTRUÇÃO DOS AGREGADOS DIÁRIOS")
+        self.logger.info("="*80)
+        
+        rebuilt_days = 0
+        connection = self.db_manager.get_connection()
+        cursor = connection.cursor()
+        try:
+            if start_date and end_date:
+                first_day = datetime.strptime(start_date[:10], '%Y-%m-%d').date()
+                last_day = datetime.strptime(end_date[:10], '%Y-%m-%d').date()
+            else:
+                cursor.execute("SELECT CAST(MIN(call_date) AS DATE), CAST(MAX(call_date) AS DATE) FROM calls")
+                first_day, last_day = cursor.fetchone() # type: ignore
+                if first_day is None:
+                    self.logger.warning("⚠️ Nenhuma chamada encontrada para agregar")
+                    return 0
+                if isinstance(first_day, str):
+                    first_day = datetime.strptime(first_day, '%Y-%m-%d').date()
+                    last_day = datetime.strptime(last_day, '%Y-%m-%d').date()
+            
+            self.logger.info(f"🗓️ Período: {first_day} até {last_day}")
+            day = first_day
+            while day <= last_day:
+                self.refresh_rollup_day(cursor, day)
+                connection.commit()
+                rebuilt_days += 1
+                if rebuilt_days % 30 == 0:
+                    self.logger.info(f"📊 Progresso: {rebuilt_days} dia(s) reconstruído(s) (até {day})")
+                day += timedelta(days=1)
+            
+            self.logger.info(f"✅ Agregados reconstruídos para {rebuilt_days} dia(s)")
+        except Exception as e:
+            connection.rollback()
+            self.logger.error(f"❌ Erro ao reconstruir agregados: {e}")
+            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+        finally:
+            cursor.close()
+            self.db_manager.close_connection()
+        
+        return rebuilt_days
+    
+    def run_retention(self) -> Dict[str, int]:
+        """
+        Retenção: move (ou apenas remove, com RETENTION_ARCHIVE=false) as chamadas mais
+        antigas que RETENTION_CALLS_DAYS, com seus registros de mailing_data e call_recordings,
+        e remove execution_logs/work_leases mais antigos que RETENTION_LOGS_DAYS.
+        O trabalho é feito em lotes pequenos, cada um em sua própria transação curta, com
+        LOCK_TIMEOUT: o tamanho do lote se ajusta para ficar abaixo de RETENTION_CHUNK_MAX_SECONDS
+        e a execução para ao atingir RETENTION_MAX_MINUTES (status PARTIAL; a próxima continua).
+        O progresso é gravado em retention_runs a cada lote.
+        Returns: dict com as contagens removidas
+        """
+        calls_days = int(os.getenv('RETENTION_CALLS_DAYS', '365'))
+        logs_days = int(os.getenv('RETENTION_LOGS_DAYS', '180'))
+        archive = os.getenv('RETENTION_ARCHIVE', 'true').lower() == 'true'
+        compression = os.getenv('RETENTION_ARCHIVE_COMPRESSION', 'NONE').upper()
+        max_chunk_size = int(os.getenv('RETENTION_CHUNK_SIZE', '1000'))
+        chunk_max_seconds = float(os.getenv('RETENTION_CHUNK_MAX_SECONDS', '2'))
+        lock_timeout_ms = int(os.getenv('RETENTION_LOCK_TIMEOUT_MS', '2000'))
+        pause_seconds = float(os.getenv('RETENTION_CHUNK_PAUSE_SECONDS', '0.5'))
+        deadline = time.time() + float(os.getenv('RETENTION_MAX_MINUTES', '30')) * 60
+        
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        calls_cutoff = today - timedelta(days=calls_days)
+        logs_cutoff = today - timedelta(days=logs_days)
+        summary = {
+            'chunks': 0,
+            'calls_removed': 0,
+            'mailing_removed': 0,
+            'recordings_removed': 0,
+            'execution_logs_removed': 0,
+            'work_leases_removed': 0
+        }
+        
+        self.logger.info("="*80)
+        self.logger.info(f"🧹 RETENÇÃO DE DADOS - chamadas antes de {calls_cutoff:%Y-%m-%d} "
+                         f"({'arquivadas' if archive else 'removidas'}) | logs antes de {logs_cutoff:%Y-%m-%d}")
+        self.logger.info("="*80)
+        
+        # Chamadas removidas dentro da janela de re-sincronização voltariam a ser inseridas
+        resync_days = max(int(os.getenv('LOOKBACK_DAYS', '1')), int(os.getenv('RECONCILE_DAYS', '30')))
+        if calls_days <= resync_days:
+            self.logger.warning(f"⚠️ RETENTION_CALLS_DAYS ({calls_days}) não é maior que a janela de "
+                                f"re-sincronização ({resync_days} dias): registros removidos podem voltar")
+        
+        # Etapas: (descrição, SQL do lote, data de corte, chaves do resumo na ordem do SELECT)
+        steps = [
+            ('calls', _retention_calls_sql(archive), calls_cutoff,
+             ('calls_removed', 'mailing_removed', 'recordings_removed')),
+            ('execution_logs', _retention_delete_sql('execution_logs'), logs_cutoff, ('execution_logs_removed',)),
+            ('work_leases', _retention_delete_sql('work_leases'), logs_cutoff, ('work_leases_removed',))
+        ]
+        
+        status = 'COMPLETED'
+        error_message = None
+        retention_run_id = None
+        try:
+            connection = self.db_manager.get_connection()
+            cursor = connection.cursor()
+            try:
+                cursor.execute("INSERT INTO retention_runs (calls_cutoff, logs_cutoff, archived) VALUES (?, ?, ?)",
+                               (calls_cutoff, logs_cutoff, archive))
+                cursor.execute("SELECT @@IDENTITY")
+                retention_run_id = int(cursor.fetchone()[0]) # type: ignore
+                connection.commit()
+                if archive:
+                    self._apply_archive_compression(connection, cursor, compression)
+            finally:
+                cursor.close()
+            
+            chunk_size = max_chunk_size
+            for name, chunk_sql, cutoff, keys in steps:
+                while True:
+                    if time.time() >= deadline:
+                        status = 'PARTIAL'
+                        self.logger.warning("⏱️ Tempo máximo da retenção atingido - a próxima execução continua")
+                        break
+                    
+                    chunk_started = time.perf_counter()
+                    counts = self._run_retention_chunk(chunk_sql, (chunk_size, cutoff), lock_timeout_ms)
+                    elapsed = time.perf_counter() - chunk_started
+                    
+                    if counts is None:
+                        # Bloqueio com a sincronização: cede, reduz o lote e tenta de novo
+                        chunk_size = max(RETENTION_MIN_CHUNK_SIZE, chunk_size // 2)
+                        self.logger.warning(f"🔒 Lote de {name} aguardou bloqueio além de {lock_timeout_ms}ms - "
+                                            f"reduzindo lote para {chunk_size}")
+                        time.sleep(pause_seconds * 4)
+                        continue
+                    
+                    summary['chunks'] += 1
+                    for key, count in zip(keys, counts):
+                        summary[key] += count
+                    self._update_retention_run(retention_run_id, summary)
+                    
+                    # Mantém cada lote abaixo do tempo alvo
+                    if elapsed > chunk_max_seconds:
+                        chunk_size = max(RETENTION_MIN_CHUNK_SIZE, chunk_size // 2)
+                    elif elapsed < chunk_max_seconds / 4:
+                        chunk_size = min(max_chunk_size, chunk_size * 2)
+                    
+                    if counts[0] == 0:
+                        break
+                    time.sleep(pause_seconds)
+                
+                if status == 'PARTIAL':
+                    break
+                self.logger.info(f"✅ Retenção de {name} concluída")
+        
+        except Exception as e:
+            status = 'FAILED'
+            error_message = str(e)
+            self.logger.error(f"❌ Erro na retenção: {e}")
+            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+        finally:
+            if retention_run_id is not None:
+                self._update_retention_run(retention_run_id, summary, status, error_message)
+            self.db_manager.close_connection()
+        
+        self.logger.info("="*80)
+        self.logger.info(f"📋 RELATÓRIO DE RETENÇÃO ({status})")
+        self.logger.info(f"📞 Chamadas: {summary['calls_removed']} | 📇 Mailing: {summary['mailing_removed']} | "
+                         f"🎙️ Gravações: {summary['recordings_removed']}")
+        self.logger.info(f"📜 Logs de execução: {summary['execution_logs_removed']} | "
+                         f"🤝 Leases: {summary['work_leases_removed']} | 📦 Lotes: {summary['chunks']}")
+        self.logger.info("="*80)
+        
+        return summary
+    
+    def _run_retention_chunk(self, chunk_sql: str, params: Tuple, lock_timeout_ms: int) -> Optional[Tuple[int, ...]]:
+        """Executa e confirma um lote da retenção; retorna None se o lote excedeu o LOCK_TIMEOUT"""
+        connection = self.db_manager.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute(f"SET LOCK_TIMEOUT {int(lock_timeout_ms)}")
+            cursor.execute(chunk_sql, params)
+            counts = tuple(int(value or 0) for value in cursor.fetchone()) # type: ignore
+            connection.commit()
+            return counts
+        except Exception as e:
+            connection.rollback()
+            # 1222: Lock request time out period exceeded
+            if '1222' in str(e):
+                return None
+            raise
+        finally:
+            cursor.close()
+    
+    def _update_retention_run(self, retention_run_id: int, summary: Dict[str, int],
+                              status: Optional[str] = None, error_message: Optional[str] = None):
+        """Grava o progresso (e, ao final, o status) da execução em retention_runs"""
+        connection = self.db_manager.get_connection()
+        cursor = connection.cursor()
+        try:
+            cursor.execute("""
+            UPDATE retention_runs
+            SET chunks = ?, calls_removed = ?, mailing_removed = ?, recordings_removed = ?,
+                execution_logs_removed = ?, work_leases_removed = ?,
+                status = COALESCE(?, status), error_message = ?,
+                finished_at = CASE WHEN ? IS NULL THEN NULL ELSE GETDATE() END
+            WHERE id = ?
+            """, (summary['chunks'], summary['calls_removed'], summary['mailing_removed'],
+                  summary['recordings_removed'], summary['execution_logs_removed'],
+                  summary['work_leases_removed'], status, error_message, status, retention_run_id))
+            connection.commit()
+        except Exception as e:
+            connection.rollback()
+            self.logger.error(f"❌ Erro ao registrar progresso da retenção: {e}")
+        finally:
+            cursor.close()
+    
+    def _apply_archive_compression(self, connection, cursor, compression: str):
+        """Aplica RETENTION_ARCHIVE_COMPRESSION (NONE, ROW ou PAGE) às tabelas de arquivo, se ainda não aplicada"""
+        if compression not in ('NONE', 'ROW', 'PAGE'):
+            self.logger.warning(f"⚠️ RETENTION_ARCHIVE_COMPRESSION inválido: {compression} - ignorado")
+            return
+        
+        for table in ('calls_archive', 'mailing_data_archive'):
+            cursor.execute(
+                "SELECT TOP 1 data_compression_desc FROM sys.partitions WHERE object_id = OBJECT_ID(?) AND index_id IN (0, 1)",
+                (table,)
+            )
+            row = cursor.fetchone()
+            if row and row[0] == compression:
+                continue
+            
+            self.logger.info(f"🗜️ Reconstruindo {table} com DATA_COMPRESSION = {compression}...")
+            try:
+                cursor.execute(f"ALTER TABLE {table} REBUILD WITH (DATA_COMPRESSION = {compression})")
+                connection.commit()
+            except Exception as e:
+                # Compressão indisponível na edição do SQL Server: segue sem compressão
+                connection.rollback()
+                self.logger.warning(f"⚠️ Não foi possível comprimir {table}: {e}")
+    
     def run_daily_sync(self) -> Dict[str, int]:
-        """Executa sincronização diária (dia anterior)"""
+        """
+        Executa sincronização diária (dia anterior). Com LOOKBACK_DAYS > 1, re-busca
+        os últimos N dias; só os registros novos ou alterados (pelo hash) são gravados.
+        """
         yesterday = datetime.now() - timedelta(days=1)
-        start_date = yesterday.strftime("%Y-%m-%d 00:00:00")
+        lookback_days = max(1, int(os.getenv('LOOKBACK_DAYS', '1')))
+        first_day = yesterday - timedelta(days=lookback_days - 1)
+        start_date = first_day.strftime("%Y-%m-%d 00:00:00")
         end_date = yesterday.strftime("%Y-%m-%d 23:59:59")
         
         self.logger.info("="*80)
-        self.logger.info(f"📅 EXECUTANDO SINCRONIZAÇÃO DIÁRIA - {yesterday.strftime('%Y-%m-%d')}")
+        if lookback_days > 1:
+            self.logger.info(f"📅 EXECUTANDO SINCRONIZAÇÃO DIÁRIA COM LOOKBACK DE {lookback_days} DIAS - "
+                             f"{first_day.strftime('%Y-%m-%d')} até {yesterday.strftime('%Y-%m-%d')}")
+        else:
+            self.logger.info(f"📅 EXECUTANDO SINCRONIZAÇÃO DIÁRIA - {yesterday.strftime('%Y-%m-%d')}")
         self.logger.info("="*80)
         
-        return self.process_data(start_date, end_date, self.campaign_ids)
+        if self._get_lease_manager():
+            # Todas as instâncias disparadas no mesmo dia compartilham a mesma execução
+            return self.run_leased_sync(f"daily:{datetime.now():%Y-%m-%d}", start_date, end_date)
+        return self.process_data(start_date, end_date)
+    
+    def run_scheduled_job(self):
+        """Job agendado: sincronização diária seguida da retenção (se RETENTION_ENABLED=true)"""
+        self.run_daily_sync()
+        if os.getenv('RETENTION_ENABLED', 'false').lower() == 'true':
+            self.run_retention()
     
-    def run_period_sync(self, start_date: str, end_date: str, campaign_ids: str) -> Dict[str, int]:
+    def run_period_sync(self, start_date: str, end_date: str, campaign_ids: Optional[str] = None) -> Dict[str, int]:
         """Executa sincronização para um período específico"""
         self.logger.info("="*80)
         self.logger.info(f"📅 EXECUTANDO SINCRONIZAÇÃO POR PERÍODO")
         self.logger.info(f"🗓️ De: {start_date}")
         self.logger.info(f"🗓️ Até: {end_date}")
-        self.logger.info(f"📊 Campanhas: {campaign_ids}")
+        self.logger.info(f"📊 Campanhas: {campaign_ids or 'as configuradas em cada conta'}")
         self.logger.info("="*80)
         
+        if self._get_lease_manager():
+            return self.run_leased_sync(f"period:{start_date}|{end_date}", start_date, end_date, campaign_ids)
         return self.process_data(start_date, end_date, campaign_ids)
     
+    def run_leased_sync(self, run_key: str, start_date: str, end_date: str,
+                        campaign_ids: Optional[str] = None) -> Dict[str, int]:
+        """
+        Sincroniza o período dividido em unidades (conta, dia, campanha) coordenadas
+        por work_leases: cada unidade é processada por uma única instância. Enquanto
+        outras instâncias tiverem unidades em andamento (ou houver falhas aguardando nova
+        tentativa), aguarda para assumi-las; termina quando não houver mais trabalho na
+        execução. Unidades já concluídas (DONE) nesta execução não são reprocessadas; as
+        que esgotaram as tentativas são reportadas e somadas em incomplete_runs.
+        """
+        lease_manager = self._get_lease_manager()
+        start = datetime.strptime(start_date, '%Y-%m-%d %H:%M:%S')
+        end = datetime.strptime(end_date, '%Y-%m-%d %H:%M:%S') + timedelta(seconds=1)
+        accounts_by_name = {account['name']: account for account in self.accounts}
+        account_names = list(accounts_by_name)
+        poll_seconds = int(os.getenv('LEASE_POLL_SECONDS', '30'))
+        stats = {key: 0 for key in ('total_records', 'successful_records', 'failed_records',
+                                    'inserted_records', 'updated_records', 'unchanged_records',
+                                    'incomplete_runs')}
+        units_processed = 0
+        start_time = time.time()
+        
+        try:
+            units = []
+            for account in self.accounts:
+                account_campaigns = campaign_ids or account['campaign_ids']
+                campaign_list = [int(campaign_id) for campaign_id in account_campaigns.split(',') if campaign_id.strip()]
+                for day_start, day_end in self._split_windows(start, end, timedelta(days=1)):
+                    units.extend((account['name'], day_start, day_end, campaign_id) for campaign_id in campaign_list)
+            lease_manager.ensure_units(run_key, units)
+            self.logger.info(f"🤝 Execução {run_key}: {len(units)} unidade(s) (conta × dia × campanha)")
+            
+            while True:
+                unit = lease_manager.claim(run_key, account_names)
+                if unit is None:
+                    waiting = lease_manager.count_waiting(run_key, account_names)
+                    if not waiting:
+                        break
+                    self.logger.info(f"⏳ {waiting} unidade(s) em andamento em outras instâncias ou aguardando nova "
+                                     f"tentativa - aguardando {poll_seconds}s...")
+                    time.sleep(poll_seconds)
+                    continue
+                
+                window_start, window_end = self._api_window(unit['window_start'], unit['window_end'])
+                self.logger.info(f"🤝 Unidade reivindicada (tentativa {unit['attempts']}): [{unit['account_name']}] "
+                                 f"{window_start} até {window_end} | campanha {unit['campaign_id']}")
+                with lease_manager.hold(unit):
+                    unit_stats = self.process_data(window_start, window_end, str(unit['campaign_id']),
+                                                   [accounts_by_name[unit['account_name']]])
+                
+                success = unit_stats['incomplete_runs'] == 0
+                lease_manager.complete(unit, success, None if success else
+                                       "Execução interrompida ou incompleta (ver execution_logs)")
+                units_processed += 1
+                # incomplete_runs reflete só as unidades que ficaram sem conclusão (abaixo)
+                for key in stats:
+                    if key != 'incomplete_runs':
+                        stats[key] += unit_stats[key]
+            
+            # Unidades que nenhuma instância vai concluir (tentativas esgotadas)
+            unfinished = lease_manager.list_unfinished(run_key, account_names)
+            for account_name, window_start, campaign_id, status, attempts, error_message in unfinished:
+                self.logger.error(f"❌ Unidade não concluída: [{account_name}] {window_start:%Y-%m-%d} campanha "
+                                  f"{campaign_id} | {status} após {attempts} tentativa(s) | {error_message}")
+            stats['incomplete_runs'] += len(unfinished)
+        
+        except Exception as e:
+            stats['incomplete_runs'] += 1
+            self.logger.error(f"❌ Erro na sincronização coordenada: {e}")
+            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+        
+        stats['execution_time'] = int(time.time() - start_time)
+        self.logger.info(f"🤝 Execução {run_key}: {units_processed} unidade(s) processada(s) por esta instância | "
+                         f"{stats['successful_records']}/{stats['total_records']} registros salvos "
+                         f"em {stats['execution_time']} segundos")
+        return stats
+    
+    def count_db_calls(self, start: datetime, end: datetime, campaign_ids: List[int],
+                       granularity: str = 'day') -> Dict[Tuple[datetime, int], int]:
+        """
+        Conta os registros de calls por janela (dia ou hora) e campanha em uma única consulta
+        end é exclusivo
+        Returns: {(início_da_janela, campaign_id): quantidade}
+        """
+        unit = 'hour' if granularity == 'hour' else 'day'
+        placeholders = ', '.join('?' for _ in campaign_ids)
+        count_sql = f"""
+        SELECT DATEADD({unit}, DATEDIFF({unit}, 0, call_date), 0) AS window_start, campaign_id, COUNT(*)
+        FROM calls
+        WHERE call_date >= ? AND call_date < ? AND campaign_id IN ({placeholders})
+        GROUP BY DATEADD({unit}, DATEDIFF({unit}, 0, call_date), 0), campaign_id
+        """
+        
+        cursor = self.db_manager.get_connection().cursor()
+        try:
+            cursor.execute(count_sql, (start, end, *campaign_ids))
+            return {(row[0], int(row[1])): int(row[2]) for row in cursor.fetchall()}
+        finally:
+            cursor.close()
+    
+    @staticmethod
+    def _split_windows(start: datetime, end: datetime, size: timedelta) -> List[Tuple[datetime, datetime]]:
+        """Divide [start, end) em janelas alinhadas ao tamanho (dia ou hora), recortadas nos limites"""
+        if size >= timedelta(days=1):
+            boundary = start.replace(hour=0, minute=0, second=0, microsecond=0)
+        else:
+            boundary = start.replace(minute=0, second=0, microsecond=0)
+        
+        windows = []
+        while boundary < end:
+            windows.append((max(boundary, start), min(boundary + size, end)))
+            boundary += size
+        return windows
+    
+    @staticmethod
+    def _api_window(start: datetime, end: datetime) -> Tuple[str, str]:
+        """Converte uma janela [start, end) para o formato de datas (fim inclusivo) da API"""
+        return start.strftime('%Y-%m-%d %H:%M:%S'), (end - timedelta(seconds=1)).strftime('%Y-%m-%d %H:%M:%S')
+    
+    def run_reconciliation(self, start_date: str, end_date: str) -> Dict[str, int]:
+        """
+        Modo de reconciliação: compara, por campanha, o total informado pela API
+        com o total gravado em calls e re-sincroniza apenas as janelas divergentes.
+        A comparação desce de nível somente onde há diferença:
+        período inteiro -> dias -> horas; apenas as horas divergentes são re-buscadas.
+        Returns: dict com estatísticas da reconciliação
+        """
+        start = datetime.strptime(start_date, '%Y-%m-%d %H:%M:%S')
+        end = datetime.strptime(end_date, '%Y-%m-%d %H:%M:%S') + timedelta(seconds=1)
+        summary = {
+            'api_queries': 0,
+            'db_queries': 0,
+            'windows_mismatched': 0,
+            'windows_resynced': 0,
+            'records_resynced': 0
+        }
+        
+        self.logger.info("="*80)
+        self.logger.info(f"🔎 RECONCILIAÇÃO API x BANCO - {start_date} até {end_date}")
+        self.logger.info("="*80)
+        
+        def api_count(window_start: datetime, window_end: datetime, campaign_id: int, account: Dict) -> Optional[int]:
+            summary['api_queries'] += 1
+            return self.fetch_api_count(*self._api_window(window_start, window_end), str(campaign_id), account)
+        
+        try:
+            for account in self.accounts:
+                campaign_list = [int(campaign_id) for campaign_id in account['campaign_ids'].split(',') if campaign_id.strip()]
+                if not campaign_list:
+                    continue
+                
+                summary['db_queries'] += 1
+                daily_counts = self.count_db_calls(start, end, campaign_list, 'day')
+                
+                for campaign_id in campaign_list:
+                    tag = f"[{account['name']}] Campanha {campaign_id}"
+                    
+                    # Nível 1: período inteiro
+                    api_total = api_count(start, end, campaign_id, account)
+                    db_total = sum(count for (_, count_campaign), count in daily_counts.items() if count_campaign == campaign_id)
+                    if api_total is not None and api_total == db_total:
+                        self.logger.info(f"✅ {tag}: API={api_total} | Banco={db_total} - consistente")
+                        continue
+                    self.logger.warning(f"⚠️ {tag}: API={api_total} | Banco={db_total} - verificando por dia...")
+                    
+                    # Nível 2: dias
+                    for day_start, day_end in self._split_windows(start, end, timedelta(days=1)):
+                        day_key = day_start.replace(hour=0, minute=0, second=0, microsecond=0)
+                        api_day = api_count(day_start, day_end, campaign_id, account)
+                        db_day = daily_counts.get((day_key, campaign_id), 0)
+                        if api_day is None or api_day <= db_day:
+                            if api_day is None or api_day < db_day:
+                                self.logger.warning(f"⚠️ {tag} {day_key:%Y-%m-%d}: API={api_day} | Banco={db_day} - "
+                                                    f"não é possível re-sincronizar")
+                            continue
+                        
+                        # Nível 3: horas do dia divergente
+                        summary['db_queries'] += 1
+                        hourly_counts = self.count_db_calls(day_start, day_end, [campaign_id], 'hour')
+                        for hour_start, hour_end in self._split_windows(day_start, day_end, timedelta(hours=1)):
+                            hour_key = hour_start.replace(minute=0, second=0, microsecond=0)
+                            db_hour = hourly_counts.get((hour_key, campaign_id), 0)
+                            api_hour = api_count(hour_start, hour_end, campaign_id, account)
+                            if api_hour is None or api_hour <= db_hour:
+                                continue
+                            
+                            summary['windows_mismatched'] += 1
+                            window_start, window_end = self._api_window(hour_start, hour_end)
+                            self.logger.info(f"🔁 {tag} {window_start} até {window_end}: API={api_hour} | "
+                                             f"Banco={db_hour} - re-sincronizando janela")
+                            stats = self.process_data(window_start, window_end, str(campaign_id), [account])
+                            summary['windows_resynced'] += 1
+                            summary['records_resynced'] += stats['successful_records']
+        
+        except Exception as e:
+            self.logger.error(f"❌ Erro na reconciliação: {e}")
+            self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
+        finally:
+            self.db_manager.close_connection()
+        
+        self.logger.info("="*80)
+        self.logger.info("📋 RELATÓRIO DE RECONCILIAÇÃO")
+        self.logger.info(f"🌐 Consultas de contagem à API: {summary['api_queries']}")
+        self.logger.info(f"🗄️ Consultas de contagem ao banco: {summary['db_queries']}")
+        self.logger.info(f"⚠️ Janelas divergentes: {summary['windows_mismatched']}")
+        self.logger.info(f"🔁 Janelas re-sincronizadas: {summary['windows_resynced']} ({summary['records_resynced']} registros)")
+        self.logger.info("="*80)
+        
+        return summary
+    
+    def run_reconcile_execution(self) -> Dict[str, int]:
+        """Executa a reconciliação (modo reconcile) para o período configurado"""
+        start_date = os.getenv('RECONCILE_START_DATE')
+        end_date = os.getenv('RECONCILE_END_DATE')
+        if not (start_date and end_date):
+            # Padrão: últimos RECONCILE_DAYS dias até o dia anterior
+            days = int(os.getenv('RECONCILE_DAYS', '30'))
+            yesterday = datetime.now() - timedelta(days=1)
+            start_date = (yesterday - timedelta(days=days - 1)).strftime("%Y-%m-%d 00:00:00")
+            end_date = yesterday.strftime("%Y-%m-%d 23:59:59")
+        
+        return self.run_reconciliation(start_date, end_date)
+    
     def parse_cron_schedule(self, cron_expr: str) -> str:
         """
         Converte expressão CRON em formato do schedule
@@ -849,6 +3082,8 @@ class API3CRobot:
     
     def schedule_job(self):
         """Configura e executa o agendamento baseado no CRON"""
+        import schedule
+        
         self.logger.info("⏰ Configurando agendamento de execução...")
         
         try:
@@ -856,19 +3091,25 @@ class API3CRobot:
             
             if schedule_format.startswith("daily_at_"):
                 time_part = schedule_format.replace("daily_at_", "")
-                schedule.every().day.at(time_part).do(self.run_daily_sync)
+                schedule.every().day.at(time_part).do(self.run_scheduled_job)
                 self.logger.info(f"✅ Job agendado para execução diária às {time_part}")
             
         except Exception as e:
             self.logger.error(f"❌ Erro ao configurar agendamento: {e}")
             self.logger.info("🔄 Usando configuração padrão: Diário às 02:00")
-            schedule.every().day.at("02:00").do(self.run_daily_sync)
+            schedule.every().day.at("02:00").do(self.run_scheduled_job)
     
     def run_scheduler(self):
         """Executa o loop principal do agendador"""
+        import schedule
+        
         self.logger.info("🤖 Iniciando robô em modo agendado...")
         self.logger.info(f"📅 Configuração CRON: {self.cron_schedule}")
         
+        # A próxima execução pode estar a horas de distância: não mantém a
+        # conexão da inicialização ociosa até lá
+        self.db_manager.close_connection()
+        
         # Configura agendamento
         self.schedule_job()
         
@@ -882,6 +3123,7 @@ class API3CRobot:
                 
         except KeyboardInterrupt:
             self.logger.info("🛑 Robô interrompido pelo usuário")
+            self.shutdown(interrupted=True)
         except Exception as e:
             self.logger.error(f"❌ Erro no loop principal: {e}")
             self.logger.error(f"📝 Traceback: {traceback.format_exc()}")
@@ -897,8 +3139,9 @@ class API3CRobot:
             self.logger.info(f"📅 Parâmetros manuais detectados:")
             self.logger.info(f"   🗓️ Data início: {start_date}")
             self.logger.info(f"   🗓️ Data fim: {end_date}")
-            self.logger.info(f"   📊 Campanhas: {self.campaign_ids}")
-            return self.run_period_sync(start_date, end_date, self.campaign_ids)
+            for account in self.accounts:
+                self.logger.info(f"   📊 [{account['name']}] Campanhas: {account['campaign_ids']}")
+            return self.run_period_sync(start_date, end_date)
         else:
             self.logger.info("📅 Executando sincronização do dia anterior...")
             return self.run_daily_sync()
@@ -906,6 +3149,7 @@ class API3CRobot:
 
 def main():
     """Função principal"""
+    robot = None
     try:
         robot = API3CRobot()
         
@@ -923,13 +3167,33 @@ def main():
             # Execução agendada
             robot.run_scheduler()
             
+        elif execution_mode == 'reconcile':
+            # Reconciliação API x banco
+            robot.run_reconcile_execution()
+            robot.logger.info("✅ Reconciliação concluída")
+            
+        elif execution_mode == 'retention':
+            # Retenção/arquivamento dos dados antigos
+            robot.run_retention()
+            robot.logger.info("✅ Retenção concluída")
+            
+        elif execution_mode == 'rebuild_rollups':
+            # Reconstrução dos agregados diários
+            robot.rebuild_rollups(os.getenv('ROLLUP_START_DATE'), os.getenv('ROLLUP_END_DATE'))
+            robot.logger.info("✅ Reconstrução dos agregados concluída")
+            
         else:
             robot.logger.error(f"❌ Modo de execução inválido: {execution_mode}")
-            robot.logger.info("💡 Modos válidos: 'manual' ou 'scheduled'")
+            robot.logger.info("💡 Modos válidos: 'manual', 'scheduled', 'reconcile', 'retention' ou 'rebuild_rollups'")
             sys.exit(1)
         
+        # Aguarda tarefas em segundo plano (downloads de gravações)
+        robot.shutdown()
+        
     except KeyboardInterrupt:
         print("\n🛑 Execução interrompida pelo usuário")
+        if robot is not None:
+            robot.shutdown(interrupted=True)
         sys.exit(0)
     except Exception as e:
         print(f"💥 Erro crítico na execução: {e}")
@@ -0,0 +1,488 @@
+"""
+Micro-benchmarks dos caminhos quentes do robô (transformação, montagem de
+parâmetros, escrita em lote e loop de páginas do process_data).
+
+Usa fixtures sintéticas determinísticas e um cursor falso que apenas registra
+os comandos, de modo que nenhum banco ou API é necessário.
+
+Uso:
+    python benchmarks/bench_hot_paths.py                       # executa e imprime os resultados
+    python benchmarks/bench_hot_paths.py --save-baseline v1.2  # grava benchmarks/baselines/v1.2.json
+    python benchmarks/bench_hot_paths.py --compare v1.2        # compara com o baseline (sai com 1 se regrediu)
+
+Cada etapa é repetida em amostras de pelo menos --min-seconds; a vazão reportada é a
+mediana das amostras e a dispersão é o intervalo interquartil relativo à mediana. Um
+baseline só é gravado se a dispersão de todas as etapas ficar abaixo de --max-spread.
+"""
+import argparse
+import gc
+import json
+import logging
+import math
+import os
+import platform
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Tuple
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Recursos opcionais fixos durante as medições: o import do app carrega o .env (sem
+# sobrescrever variáveis já definidas), que não pode ligar gravações, leases ou profiling
+os.environ.update({
+    'RECORDINGS_ENABLED': 'false',
+    'LEASES_ENABLED': 'false',
+    'ROLLUPS_ENABLED': 'true',
+    'PROFILE_CPU': 'off',
+    'PROFILE_MEMORY': 'false',
+    'PROFILE_TIMINGS': 'false'
+})
+
+import app  # noqa: E402
+
+BASELINE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines')
+
+FIXTURE_SEED = 3
+STATUSES = ['Atendida', 'Não atendida', 'Caixa postal', 'Ocupado', 'Abandonada']
+QUALIFICATIONS = ['Venda', 'Sem interesse', 'Retornar', None]
+
+
+def make_call(rng: random.Random, index: int) -> Dict:
+    """Gera um registro sintético no formato retornado pela API 3C"""
+    call_date = datetime(2025, 1, 1) + timedelta(seconds=rng.randrange(86400 * 30))
+    call = {
+        'id': f"{index:024x}",
+        'list': f"Lista {rng.randrange(20)}",
+        'number': f"55119{rng.randrange(10**8):08d}",
+        'call_date': call_date.strftime('%Y-%m-%d %H:%M:%S'),
+        'call_date_rfc3339': call_date.strftime('%Y-%m-%dT%H:%M:%S-03:00'),
+        'campaign_id': rng.choice([202443, 203894, 204001]),
+        'campaign': 'Campanha sintética',
+        'queue_id': None,
+        'queue_name': None,
+        'ring_group_id': None,
+        'ring_group_name': None,
+        'ivr_name': None,
+        'receptive_name': None,
+        'receptive_phone': None,
+        'receptive_did': None,
+        'has_agent': rng.random() < 0.6,
+        'agent': f"Agente {rng.randrange(50)}",
+        'acw_time': '00:00:05',
+        'speaking_time': f"00:0{rng.randrange(10)}:{rng.randrange(60):02d}",
+        'ivr_time': '00:00:00',
+        'ivr_after_call_time': '00:00:00',
+        'amd_time': '00:00:02',
+        'waiting_time': f"00:00:{rng.randrange(60):02d}",
+        'speaking_with_agent_time': f"00:0{rng.randrange(10)}:{rng.randrange(60):02d}",
+        'route': {
+            'id': rng.randrange(1, 10),
+            'name': 'Rota principal',
+            'host': 'sip.exemplo.com.br',
+            'endpoint': 'sip:rota@sip.exemplo.com.br',
+            'caller_id': '551130000000'
+        },
+        'billed_time': f"00:0{rng.randrange(10)}:00",
+        'billed_value': f"{rng.random():.4f}",
+        'qualification': rng.choice(QUALIFICATIONS),
+        'behavior': 'normal',
+        'readable_behavior_text': 'Normal',
+        'phone_type': rng.choice(['mobile', 'landline']),
+        'recording': f"https://gravacoes.exemplo.com.br/{index}.mp3",
+        'recording_amd': None,
+        'status_id': rng.randrange(1, 8),
+        'readable_status_text': rng.choice(STATUSES),
+        'readable_amd_status_text': None,
+        'mode': 'dialer',
+        'hangup_cause': 16,
+        'sip_cause': '200',
+        'readable_hangup_cause_text': 'Normal Clearing',
+        'feedback': None,
+        'recorded': True,
+        'ended_by_agent': rng.random() < 0.5,
+        'qualification_note': 'Observação ' * rng.randrange(0, 5) or None,
+        'sid': f"sid-{index}",
+        'is_dmc': rng.random() < 0.3,
+        'is_unknown': False,
+        'is_transferred': False,
+        'is_consult': False,
+        'is_transfer': False,
+        'is_conversion': rng.random() < 0.1,
+        'qualification_id': rng.randrange(1, 5),
+        'consult_cancelled': False,
+        'recording_transfer': None,
+        'recording_consult': None,
+        'recording_after_consult_cancel': None,
+        'ivr_digit_pressed': None,
+        'record_name': None,
+        'transcription': ('Texto transcrito ' * rng.randrange(0, 40)) or None,
+        'ai_evaluation_status': None
+    }
+    if rng.random() < 0.8:
+        call['mailing_data'] = {
+            '_id': f"m{index:023x}",
+            'identifier': f"{rng.randrange(10**11):011d}",
+            'campaign_id': call['campaign_id'],
+            'company_id': 42,
+            'list_id': rng.randrange(1000),
+            'uf': 'SP',
+            'phone': call['number'],
+            'dialed_phone': 1,
+            'dialed_identifier': 1,
+            'on_calling': 0,
+            'column_position': 1,
+            'row_position': index,
+            'data': {
+                'ESTRATEGIA': 'Padrão',
+                'RAZAO SOCIAL': f"Empresa {index} LTDA",
+                'NOME FANTASIA': f"Empresa {index}",
+                'VALOR CONTA': f"{rng.randrange(100, 10000)},00",
+                'CIDADE': 'São Paulo',
+                'CEP': '01000-000',
+                'UF': 'SP',
+                'SOCIO': 'Fulano de Tal'
+            }
+        }
+    return call
+
+
+def make_pages(total_records: int, page_size: int) -> List[List[Dict]]:
+    """Gera páginas determinísticas de registros sintéticos"""
+    rng = random.Random(FIXTURE_SEED)
+    calls = [make_call(rng, index) for index in range(total_records)]
+    return [calls[start:start + page_size] for start in range(0, total_records, page_size)]
+
+
+class FakeCursor:
+    """Cursor falso: registra os comandos executados e simula as consultas de hash"""
+
+    def __init__(self, connection: 'FakeConnection'):
+        self.connection = connection
+        self.fast_executemany = False
+        self._rows = []
+
+    def execute(self, sql: str, params=()):
+        self.connection.executes += 1
+        if 'SELECT id, row_hash' in sql:
+            stored = self.connection.stored_hashes
+            self._rows = [(call_id, stored[call_id]) for call_id in params if call_id in stored]
+        else:
+            self._rows = [(1,)]
+        return self
+
+    def executemany(self, sql: str, seq_of_params):
+        self.connection.executes += 1
+        self.connection.batched_rows += len(seq_of_params)
+
+    def fetchone(self):
+        return self._rows[0] if self._rows else None
+
+    def fetchall(self):
+        return self._rows
+
+    def close(self):
+        pass
+
+
+class FakeConnection:
+    """Conexão falsa com contadores de comandos"""
+
+    def __init__(self, stored_hashes: Dict[str, str]):
+        self.stored_hashes = stored_hashes
+        self.executes = 0
+        self.batched_rows = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+
+class FakeDatabaseManager:
+    """Substitui o DatabaseManager mantendo a mesma interface usada pelo robô"""
+
+    def __init__(self, stored_hashes: Dict[str, str]):
+        self.connection = FakeConnection(stored_hashes)
+
+    def get_connection(self):
+        return self.connection
+
+    def close_connection(self):
+        pass
+
+
+def make_robot(stored_hashes: Dict[str, str]) -> app.API3CRobot:
+    """Cria um robô sem executar o __init__ (sem conexão real nem arquivos de log)"""
+    logger = logging.getLogger('API3CRobot.bench')
+    logger.addHandler(logging.NullHandler())
+    logger.propagate = False
+    logger.setLevel(logging.WARNING)
+
+    robot = app.API3CRobot.__new__(app.API3CRobot)
+    robot.logger = logger
+    robot.db_manager = FakeDatabaseManager(stored_hashes)
+    robot.profiler = app.RunProfiler(logger)
+    robot.recording_downloader = None
+    robot.lease_manager = None
+    robot.accounts = [{
+        'name': 'bench',
+        'manager_token': 'bench',
+        'base_url': None,
+        'campaign_ids': '202443,203894,204001',
+        'per_page': 0,
+        'min_request_interval': 0.0
+    }]
+    robot.rate_limiters = {account['name']: app.RateLimiter(0.0) for account in robot.accounts}
+    return robot
+
+
+def make_stored_hashes(robot: app.API3CRobot, pages: List[List[Dict]]) -> Dict[str, str]:
+    """Simula um banco com metade dos registros já gravados (10% deles alterados)"""
+    rng = random.Random(FIXTURE_SEED + 1)
+    stored = {}
+    for page in pages:
+        for row in robot.transform_page(page):
+            if rng.random() < 0.5:
+                stored[row['id']] = row['row_hash'] if rng.random() < 0.8 else '0' * 32
+    return stored
+
+
+def measure(name: str, func: Callable[[], Tuple[int, Any]], repeats: int, min_seconds: float) -> Dict:
+    """
+    Mede func (que retorna a quantidade de registros processados e os objetos produzidos).
+    Tempo: repeats amostras, cada uma executando func quantas vezes forem necessárias para
+    durar ao menos min_seconds; reporta a mediana da vazão e a dispersão (intervalo
+    interquartil / mediana). Memória: em uma execução extra com tracemalloc, os blocos
+    retidos ao final (diferença entre snapshots, com os objetos produzidos ainda vivos) e o
+    pico de memória. Alocações temporárias liberadas durante a execução não entram na
+    contagem de blocos, apenas no pico
+    """
+    # Aquecimento, que também calibra quantas execuções cabem em uma amostra
+    gc.collect()
+    started = time.perf_counter()
+    records, _ = func()
+    loops = max(1, math.ceil(min_seconds / max(time.perf_counter() - started, 1e-9)))
+    
+    throughputs = []
+    for _ in range(repeats):
+        gc.collect()
+        started = time.perf_counter()
+        for _ in range(loops):
+            func()
+        throughputs.append(records * loops / (time.perf_counter() - started))
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    _, produced = func()
+    after = tracemalloc.take_snapshot()
+    del produced
+    _, peak_bytes = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    retained_blocks = sum(stat.count_diff for stat in after.compare_to(before, 'lineno') if stat.count_diff > 0)
+
+    median = statistics.median(throughputs)
+    quartiles = statistics.quantiles(throughputs, n=4) if len(throughputs) > 1 else [median] * 3
+    return {
+        'name': name,
+        'records': records,
+        'samples': repeats,
+        'loops_per_sample': loops,
+        'records_per_second': round(median, 1),
+        'spread': round((quartiles[2] - quartiles[0]) / median, 3) if median else None,
+        'retained_blocks_per_record': round(retained_blocks / records, 2) if records else None,
+        'peak_bytes_per_record': round(peak_bytes / records, 1) if records else None
+    }
+
+
+def machine_info() -> Dict:
+    """Identifica a máquina em que o benchmark foi executado"""
+    processor = platform.processor()
+    try:
+        with open('/proc/cpuinfo', encoding='utf-8') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    processor = line.split(':', 1)[1].strip()
+                    break
+    except OSError:
+        pass
+    return {
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': processor or None,
+        'cpu_count': os.cpu_count(),
+        'python': f"{platform.python_implementation()} {platform.python_version()}"
+    }
+
+
+def run_benchmarks(total_records: int, page_size: int, repeats: int, min_seconds: float) -> Dict:
+    """Executa todas as etapas e retorna o relatório"""
+    pages = make_pages(total_records, page_size)
+    all_calls = [call for page in pages for call in page]
+    robot = make_robot({})
+    stored_hashes = make_stored_hashes(robot, pages)
+    robot.db_manager = FakeDatabaseManager(stored_hashes)
+    transformed = [robot.transform_page(page) for page in pages]
+
+    def transform_values():
+        produced = [(robot.build_call_values(call_data), robot.build_mailing_values(call_data))
+                    for call_data in all_calls]
+        return len(all_calls), produced
+
+    def transform_and_hash():
+        produced = [robot.transform_page(page) for page in pages]
+        return len(all_calls), produced
+
+    def build_write_params():
+        produced = []
+        for rows in transformed:
+            produced.append((
+                [row['call_values'] + (row['row_hash'],) for row in rows],
+                [row['call_values'][1:] + (row['row_hash'], row['id']) for row in rows],
+                [row['mailing_values'] for row in rows if row['mailing_values']]
+            ))
+        return sum(len(rows) for rows in transformed), produced
+
+    def batch_write():
+        produced = [robot.save_page_to_db(page) for page in pages]
+        return len(all_calls), produced
+
+    def process_data_loop():
+        robot.fetch_api_data = lambda *args, **kwargs: iter(pages)
+        stats = robot.process_data('2025-01-01 00:00:00', '2025-01-30 23:59:59')
+        if stats['total_records'] != len(all_calls):
+            # process_data registra e engole exceções: sem esta verificação a etapa mediria uma falha
+            raise RuntimeError(f"process_data processou {stats['total_records']} de {len(all_calls)} registros")
+        return stats['total_records'], stats
+
+    results = [
+        measure('transform_values', transform_values, repeats, min_seconds),
+        measure('transform_and_hash', transform_and_hash, repeats, min_seconds),
+        measure('build_write_params', build_write_params, repeats, min_seconds),
+        measure('batch_write', batch_write, repeats, min_seconds),
+        measure('process_data_loop', process_data_loop, repeats, min_seconds)
+    ]
+
+    return {
+        'created_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'machine': machine_info(),
+        'fixture': {'records': total_records, 'page_size': page_size, 'seed': FIXTURE_SEED},
+        'results': {result['name']: result for result in results}
+    }
+
+
+def compare(report: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    """
+    Compara as medianas com o baseline e retorna as regressões. Uma queda de vazão só é
+    regressão se passar da tolerância e também da dispersão somada das duas medições
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        previous = baseline['results'].get(name)
+        if not previous:
+            continue
+        noise = (result.get('spread') or 0) + (previous.get('spread') or 0)
+        allowed_drop = max(tolerance, noise)
+        if result['records_per_second'] < previous['records_per_second'] * (1 - allowed_drop):
+            regressions.append(f"{name}: {result['records_per_second']} rec/s "
+                               f"(baseline {previous['records_per_second']} rec/s, queda tolerada {allowed_drop:.0%})")
+        if (previous.get('retained_blocks_per_record') is not None
+                and result['retained_blocks_per_record'] > previous['retained_blocks_per_record'] * (1 + tolerance)):
+            regressions.append(f"{name}: {result['retained_blocks_per_record']} blocos retidos/registro "
+                               f"(baseline {previous['retained_blocks_per_record']})")
+    return regressions
+
+
+def comparability_warnings(report: Dict, baseline: Dict) -> List[str]:
+    """Aponta diferenças de máquina ou fixture que tornam a comparação pouco confiável"""
+    warnings = []
+    if report['fixture'] != baseline.get('fixture'):
+        warnings.append(f"fixture diferente do baseline: {report['fixture']} x {baseline.get('fixture')}")
+    current, previous = report['machine'], baseline.get('machine') or {}
+    for key in ('processor', 'cpu_count', 'python'):
+        if current.get(key) != previous.get(key):
+            warnings.append(f"{key} diferente do baseline: {current.get(key)} x {previous.get(key)}")
+    return warnings
+
+
+def unstable_stages(report: Dict, max_spread: float) -> List[str]:
+    """Etapas cuja dispersão passa de max_spread (medições não reproduzíveis nesta máquina)"""
+    return [f"{name}: dispersão {result['spread']:.1%}"
+            for name, result in report['results'].items()
+            if result['spread'] is None or result['spread'] > max_spread]
+
+
+def print_report(report: Dict):
+    print(f"Python {report['python']} | {report['fixture']['records']} registros em páginas de "
+          f"{report['fixture']['page_size']}")
+    print(f"{'etapa':<22}{'rec/s (mediana)':>16}{'dispersão':>11}{'retidos/rec':>14}{'pico bytes/rec':>18}")
+    for result in report['results'].values():
+        print(f"{result['name']:<22}{result['records_per_second']:>16,.0f}{result['spread']:>11.1%}"
+              f"{result['retained_blocks_per_record']:>14}{result['peak_bytes_per_record']:>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks dos caminhos quentes do API 3C Robot")
+    parser.add_argument('--records', type=int,
+                        help="quantidade de registros sintéticos (padrão: 5000 ou o do baseline comparado)")
+    parser.add_argument('--page-size', type=int,
+                        help="registros por página (padrão: 500 ou o do baseline comparado)")
+    parser.add_argument('--repeats', type=int, default=7, help="amostras por etapa (vale a mediana)")
+    parser.add_argument('--min-seconds', type=float, default=0.5, help="duração mínima de cada amostra")
+    parser.add_argument('--max-spread', type=float, default=0.05,
+                        help="dispersão máxima aceita para gravar um baseline (padrão: 5%%)")
+    parser.add_argument('--save-baseline', metavar='NOME', help="grava o resultado em baselines/NOME.json")
+    parser.add_argument('--compare', metavar='NOME', help="compara com baselines/NOME.json")
+    parser.add_argument('--tolerance', type=float, default=0.15, help="regressão tolerada (padrão: 15%%)")
+    args = parser.parse_args()
+
+    baseline = None
+    fixture = {'records': 5000, 'page_size': 500}
+    if args.compare:
+        path = os.path.join(BASELINE_DIR, f"{args.compare}.json")
+        with open(path, encoding='utf-8') as f:
+            baseline = json.load(f)
+        fixture.update({key: baseline['fixture'][key] for key in fixture if key in baseline.get('fixture', {})})
+
+    report = run_benchmarks(args.records or fixture['records'], args.page_size or fixture['page_size'],
+                            args.repeats, args.min_seconds)
+    print_report(report)
+
+    if args.save_baseline:
+        unstable = unstable_stages(report, args.max_spread)
+        if unstable:
+            print(f"Baseline não gravado: medições instáveis nesta máquina (dispersão acima de {args.max_spread:.0%}):")
+            for stage in unstable:
+                print(f"  - {stage}")
+            sys.exit(1)
+        os.makedirs(BASELINE_DIR, exist_ok=True)
+        path = os.path.join(BASELINE_DIR, f"{args.save_baseline}.json")
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Baseline gravado em {path}")
+
+    if baseline:
+        for warning in comparability_warnings(report, baseline):
+            print(f"Aviso: {warning}")
+        for stage in unstable_stages(report, args.max_spread):
+            print(f"Aviso: medição instável, quedas menores que a dispersão não são detectadas ({stage})")
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print("Regressões detectadas:")
+            for regression in regressions:
+                print(f"  - {regression}")
+            sys.exit(1)
+        print(f"Sem regressões em relação a {args.compare} (tolerância {args.tolerance:.0%})")
+
+
+if __name__ == '__main__':
+    main()